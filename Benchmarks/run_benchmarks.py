@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# The repository root, holding the modules under benchmark and the config / rules files to benchmark with
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from Benchmarks.synthetic_statements import write_dataset
+
+# The stages timed separately, in the order they run, as recorded in the processor's run metrics
+STAGES = ["read", "deduplicate", "categorize", "aggregate", "store", "output"]
+
+
+def parse_args():
+  """
+      A function to parse the command line arguments
+
+      Returns:
+      args {argparse.Namespace}     The parsed arguments
+  """
+  arg_parser = argparse.ArgumentParser(description="Benchmark the statement pipeline on synthetic statements")
+  arg_parser.add_argument("--rows", type=int, default=10000, help="Transactions per statement file")
+  arg_parser.add_argument("--files", type=int, default=4, help="Number of statement files")
+  arg_parser.add_argument("--cache-size", type=int, default=500, help="Number of names in the transaction cache")
+  arg_parser.add_argument("--unknown-rate", type=float, default=0.01, help="Fraction of transactions the cache doesn't know")
+  arg_parser.add_argument("--workers", type=int, default=1, help="Worker processes to categorize with")
+  arg_parser.add_argument("--chunk-rows", type=int, default=0, help="Stream each statement this many rows at a time, 0 to read statements whole")
+  arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the fastest is kept")
+  arg_parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic data")
+  arg_parser.add_argument("--save", help="Write the results to this JSON file")
+  arg_parser.add_argument("--baseline", help="Compare against results saved earlier with --save")
+  arg_parser.add_argument("--tolerance", type=float, default=1.25, help="Slowdown ratio against the baseline that counts as a regression")
+  return arg_parser.parse_args()
+
+
+def run_pipeline(statement_processor, workers=1, chunk_rows=0):
+  """
+      A function to run the statement pipeline once over the working directory, as a run of main does
+
+      The stage timings are the ones the processor records in its run metrics.
+
+      Args:
+      statement_processor: {module}    The statement_processor module, imported from inside the working directory
+      workers: {int}                   The number of worker processes to categorize with
+      chunk_rows: {int}                Stream each statement this many rows at a time, 0 to read statements whole
+
+      Returns:
+      stage_seconds {dict}             Key:Value sets for each stage:wall time in seconds
+      row_count {int}                  The number of transactions read
+  """
+  shutil.rmtree("OutputFiles", ignore_errors=True)
+  processor = statement_processor.StatementProcessor()
+  statement_file_names = sorted(os.listdir(processor.statements_path))
+
+  processor.process_statement_files(statement_file_names, workers, chunk_rows)
+  processor.write_categorized_transactions_csv()
+  processor.write_monthly_transactions()
+  processor.history_store.close()
+
+  stages = processor.run_metrics.stages
+  stage_seconds = {stage: stages.get(stage, {}).get("seconds", 0.0) for stage in STAGES}
+  return stage_seconds, stages.get("read", {}).get("rows", 0)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+  """
+      A function to compare each stage against a saved baseline
+
+      Args:
+      results: {dict}         The results of this run
+      baseline: {dict}        The results saved earlier
+      tolerance: {float}      The slowdown ratio that counts as a regression
+
+      Returns:
+      regressions {list}      The stages slower than the baseline by more than the tolerance
+  """
+  if baseline["params"] != results["params"]:
+    print(f"Warning: baseline was run with {baseline['params']}, this run with {results['params']}")
+
+  regressions = []
+  for stage in STAGES + ["total"]:
+    if stage not in baseline["seconds"]:
+      print(f"{stage:>10}: not in the baseline")
+      continue
+    ratio = results["seconds"][stage] / max(baseline["seconds"][stage], 1e-9)
+    flag = "REGRESSION" if ratio > tolerance else ""
+    print(f"{stage:>10}: {baseline['seconds'][stage]:8.4f}s -> {results['seconds'][stage]:8.4f}s  x{ratio:5.2f} {flag}")
+    if ratio > tolerance:
+      regressions.append(stage)
+
+  return regressions
+
+
+def main():
+  args = parse_args()
+
+  with tempfile.TemporaryDirectory() as work_dir:
+    shutil.copy(os.path.join(REPO_DIR, "config.ini"), work_dir)
+    with open(os.path.join(REPO_DIR, "stored_transaction.json"), "r") as tsf:
+      categories = list(json.load(tsf).keys())
+    write_dataset(
+      work_dir, categories, os.path.join(REPO_DIR, "categorization_rules.json"),
+      rows=args.rows, files=args.files, cache_size=args.cache_size, unknown_rate=args.unknown_rate, seed=args.seed
+    )
+
+    # The modules read config.ini from the working directory when they are imported
+    os.chdir(work_dir)
+    import statement_processor
+
+    best_seconds = None
+    for _ in range(args.repeat):
+      stage_seconds, row_count = run_pipeline(statement_processor, args.workers, args.chunk_rows)
+      stage_seconds["total"] = sum(stage_seconds.values())
+      if best_seconds is None or stage_seconds["total"] < best_seconds["total"]:
+        best_seconds = stage_seconds
+
+    os.chdir(REPO_DIR)
+
+  results = {
+    "params": {"rows": args.rows, "files": args.files, "cache_size": args.cache_size, "unknown_rate": args.unknown_rate, "seed": args.seed},
+    "rows": row_count,
+    "seconds": best_seconds,
+    "rows_per_second": {stage: row_count / max(seconds, 1e-9) for stage, seconds in best_seconds.items()},
+  }
+
+  for stage in STAGES + ["total"]:
+    print(f"{stage:>10}: {best_seconds[stage]:8.4f}s  {results['rows_per_second'][stage]:12.0f} rows/s")
+
+  if args.save:
+    with open(args.save, "wt") as results_file:
+      results_file.write(json.dumps(results, indent=4, sort_keys=True))
+
+  if args.baseline:
+    with open(args.baseline, "r") as baseline_file:
+      regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+    if regressions:
+      sys.exit(f"Slower than the baseline in: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+  main()
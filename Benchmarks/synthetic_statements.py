@@ -0,0 +1,122 @@
+import csv
+import datetime
+import json
+import os
+import random
+
+# Merchant name stems the synthetic merchants are built from, in the style of the bank's exports
+MERCHANT_STEMS = [
+  "PETSMART INC.", "LCBO/RAO #", "SHELL C", "ESSO CIRCLE K", "TIM HORTONS #", "MCDONALD'S #", "AMZN Mktp CA*",
+  "THE HOME DEPOT #", "CANADIAN TIRE #", "SHOPPERS DRUG MART #", "UBER* TRIP", "PRESTO FARE/", "SQ *",
+  "E-TRANSFER ***", "SEND E-TFR ***", "FORTINOS #", "NOFRILLS ", "METRO ", "WAL-MART SUPERCENTER#", "STARBUCKS COFFEE #",
+]
+
+# Names the categorization rules handle, so the rule engine is exercised too
+RULE_MERCHANTS = ["WL511 TFR-TO C/C    ", "CIBC MC      H4U9L9 ", "AMZN MKTP CA", "EDWARD JONES WY#001 ", "NATIONS FRESH F   _F"]
+
+
+def merchant_names(count, rng):
+  """
+      A function to build distinct synthetic merchant names
+
+      Args:
+      count: {int}               The number of names to build
+      rng: {random.Random}       The random generator to draw from
+
+      Returns:
+      names {list}               The merchant names
+  """
+  names = set()
+  while len(names) < count:
+    names.add(f"{rng.choice(MERCHANT_STEMS)}{rng.randint(0, 99999):05d}")
+  return sorted(names)
+
+
+def build_transaction_cache(categories, cache_size, rng):
+  """
+      A function to build a stored transaction cache in the layout of stored_transaction.json
+
+      Args:
+      categories: {list}         The categories to spread the names across
+      cache_size: {int}          The total number of stored names
+      rng: {random.Random}       The random generator to draw from
+
+      Returns:
+      trans_stored_cache {dict}  Key:Value sets for each TransactionType:[transaction names]
+  """
+  trans_stored_cache = {category: [] for category in categories}
+  for trans_name in merchant_names(cache_size, rng):
+    trans_stored_cache[rng.choice(categories)].append(trans_name)
+  return trans_stored_cache
+
+
+def statement_rows(row_count, known_names, unknown_names, unknown_rate, start_date, rng):
+  """
+      A function to generate statement rows in the Date, TransName, Debit, Credit, CurTot layout read_statement_file expects
+
+      Args:
+      row_count: {int}               The number of transactions
+      known_names: {list}            Names from the transaction cache
+      unknown_names: {list}          Names the cache doesn't hold
+      unknown_rate: {float}          The fraction of transactions using an unknown name
+      start_date: {datetime.date}    The date of the first transaction, the rest follow over about a year
+      rng: {random.Random}           The random generator to draw from
+
+      Returns:
+      rows {list}                    The statement rows, as lists of strings
+  """
+  rows = []
+  balance = 5000.00
+  for row_index in range(row_count):
+    trans_date = start_date + datetime.timedelta(days=row_index * 365 // max(row_count, 1))
+    roll = rng.random()
+    if roll < unknown_rate and unknown_names:
+      trans_name = rng.choice(unknown_names)
+    elif roll < unknown_rate + 0.05:
+      trans_name = rng.choice(RULE_MERCHANTS)
+    else:
+      trans_name = rng.choice(known_names)
+
+    amount = round(rng.uniform(1, 250), 2)
+    if rng.random() < 0.85:
+      balance -= amount
+      debit_value, credit_value = f"{amount:.2f}", ""
+    else:
+      balance += amount
+      debit_value, credit_value = "", f"{amount:.2f}"
+
+    rows.append([trans_date.strftime("%m/%d/%Y"), trans_name, debit_value, credit_value, f"{balance:.2f}"])
+
+  return rows
+
+
+def write_dataset(work_dir, categories, rules_file, rows=10000, files=4, cache_size=500, unknown_rate=0.01, seed=0):
+  """
+      A function to write a complete synthetic working directory: config, transaction cache, rules and statements
+
+      Args:
+      work_dir: {str}            The directory to write into
+      categories: {list}         The categories for the transaction cache
+      rules_file: {str}          The categorization rules file to copy in
+      rows: {int}                The number of transactions per statement file
+      files: {int}               The number of statement files
+      cache_size: {int}          The number of names in the transaction cache
+      unknown_rate: {float}      The fraction of transactions the cache doesn't know
+      seed: {int}                The random seed, so runs are comparable
+  """
+  rng = random.Random(seed)
+  trans_stored_cache = build_transaction_cache(categories, cache_size, rng)
+  known_names = [trans_name for trans_names in trans_stored_cache.values() for trans_name in trans_names]
+  unknown_names = [f"UNKNOWN MERCHANT {index:04d}" for index in range(max(1, cache_size // 20))]
+
+  os.makedirs(os.path.join(work_dir, "InputFiles"), exist_ok=True)
+  with open(os.path.join(work_dir, "stored_transaction.json"), "wt") as tsf:
+    tsf.write(json.dumps(trans_stored_cache, indent=4, sort_keys=True))
+
+  with open(rules_file, "r") as source_rules, open(os.path.join(work_dir, "categorization_rules.json"), "wt") as rules_copy:
+    rules_copy.write(source_rules.read())
+
+  for file_index in range(files):
+    start_date = datetime.date(2020 + file_index % 5, 1, 1)
+    with open(os.path.join(work_dir, "InputFiles", f"statement_{file_index:03d}.csv"), "w", newline="") as sf:
+      csv.writer(sf).writerows(statement_rows(rows, known_names, unknown_names, unknown_rate, start_date, rng))
@@ -1,6 +1,8 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
-from generic_helper import GenericHelper  # Assuming your file is named generic_helper.py
+from generic_helper import GenericHelper, LazyConfig  # Assuming your file is named generic_helper.py
 import pandas as pd
 
 class TestGenericHelper(unittest.TestCase):
@@ -32,5 +34,35 @@ class TestGenericHelper(unittest.TestCase):
         self.mock_logger.debug.assert_called_with("Found month Jul from data 2023-07-15")
 
 
+    def test_parse_dates(self):
+        """Test that a date column is parsed in one layout, with mixed layouts falling back per distinct value."""
+        parsed_dates = self.helper.parse_dates(pd.Series(["07/15/2023", "12/01/2023", None]))
+        self.assertEqual(list(parsed_dates[:2]), [pd.Timestamp("2023-07-15"), pd.Timestamp("2023-12-01")])
+        self.assertTrue(pd.isna(parsed_dates[2]))
+
+        parsed_dates = self.helper.parse_dates(pd.Series(["2023-07-15", "Dec 1 2023"]))
+        self.assertEqual(list(parsed_dates), [pd.Timestamp("2023-07-15"), pd.Timestamp("2023-12-01")])
+
+        # A layout given up front is used as-is, only values it doesn't fit fall back
+        parsed_dates = self.helper.parse_dates(pd.Series(["01/02/2024", "2024-03-04"]), date_format="%d/%m/%Y")
+        self.assertEqual(list(parsed_dates), [pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-04")])
+
+    def test_month_parser_parsed_date(self):
+        """Test that month_parser also accepts dates that have already been parsed."""
+        self.assertEqual(self.helper.month_parser(pd.Timestamp("2023-07-15")), "Jul")
+
+    def test_lazy_config_defaults(self):
+        """Test that settings left out of the config file keep their defaults from the config template."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_file = os.path.join(temp_dir, "config.ini")
+            with open(config_file, "w") as cf:
+                cf.write("[PROCESSING]\nworkers = 4\n")
+            config = LazyConfig(config_file)
+
+            self.assertEqual(config["PROCESSING"].getint("workers"), 4)
+            self.assertTrue(config["PROCESSING"].getboolean("deduplicate"))
+            self.assertEqual(config["OUTPUT FILES"]["history_db_file"], "transaction_history.db")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from history_store import HistoryStore
+
+
+class TestHistoryStore(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.history_store = HistoryStore(os.path.join(self.temp_dir.name, "OutputFiles", "transaction_history.db"))
+    self.statement_df = pd.DataFrame({
+      "Date": ["2024-01-15", "2024-02-03", "2024-03-20"],
+      "TransName": ["PETSMART INC. 0919", "ODDS BAR", "GEOTAB INC.      PAY"],
+      "Debit": [25.0, 40.0, None],
+      "Credit": [None, None, 2500.0],
+      "CurTot": [100.0, 60.0, 2560.0],
+      "TransType": ["Arya", "Booze", "Income"],
+    })
+
+  def tearDown(self):
+    self.history_store.close()
+    self.temp_dir.cleanup()
+
+
+  def test_read_by_date_and_category(self):
+    """Test that stored transactions can be read back narrowed by date range and category."""
+    self.history_store.append_partition("statement_1.csv", self.statement_df)
+
+    self.assertEqual(len(self.history_store.read()), 3)
+    self.assertEqual(list(self.history_store.read(start_date="2024-02-01")["TransName"]), ["ODDS BAR", "GEOTAB INC.      PAY"])
+    self.assertEqual(list(self.history_store.read(end_date="2024-02-03", trans_types=["Booze", "Income"])["TransName"]), ["ODDS BAR"])
+
+
+  def test_reprocessed_statement_replaces_partition(self):
+    """Test that storing a statement again replaces its earlier partition rather than duplicating it."""
+    self.history_store.append_partition("statement_1.csv", self.statement_df)
+    self.history_store.append_partition("statement_2.csv", self.statement_df.iloc[:1])
+    self.history_store.append_partition("statement_1.csv", self.statement_df.iloc[1:])
+
+    self.assertEqual(self.history_store.sources(), ["statement_1.csv", "statement_2.csv"])
+    self.assertEqual(len(self.history_store.read(sources=["statement_1.csv"])), 2)
+    self.assertEqual(len(self.history_store.read()), 3)
+
+
+  def test_append_to_partition(self):
+    """Test that a statement stored in chunks builds up one partition."""
+    self.history_store.append_partition("statement_1.csv", self.statement_df.iloc[:2])
+    self.history_store.append_partition("statement_1.csv", self.statement_df.iloc[2:], replace=False)
+
+    self.assertEqual(list(self.history_store.read(sources=["statement_1.csv"])["TransName"]), list(self.statement_df["TransName"]))
+
+
+  def test_stored_fingerprint_counts(self):
+    """Test that fingerprints match by normalized name and amounts, counted outside the excluded statement."""
+    self.history_store.append_partition("statement_1.csv", self.statement_df)
+    self.history_store.append_partition("statement_2.csv", self.statement_df.iloc[:1])
+
+    incoming_df = self.statement_df.assign(Date=pd.to_datetime(self.statement_df["Date"]), TransName=["Petsmart  Inc. 0919", "ODDS BAR", "GEOTAB INC. PAY"])
+    fingerprints = HistoryStore.fingerprints(incoming_df)
+    self.assertEqual(list(fingerprints), list(HistoryStore.fingerprints(self.statement_df)))
+    self.assertEqual(self.history_store.stored_counts(fingerprints), {fingerprints[0]: 2, fingerprints[1]: 1, fingerprints[2]: 1})
+    self.assertEqual(self.history_store.stored_counts(fingerprints, exclude_source="statement_1.csv"), {fingerprints[0]: 1})
+
+    self.history_store.append_partition("statement_1.csv", self.statement_df.iloc[2:])
+    self.assertEqual(self.history_store.stored_counts(fingerprints), {fingerprints[0]: 1, fingerprints[2]: 1})
+
+
+  def test_fingerprints_are_stable(self):
+    """Test that a fingerprint is the blake2b digest of the row's fields, so it doesn't change with the pandas version."""
+    self.assertEqual(list(HistoryStore.fingerprints(self.statement_df.iloc[:1])), [753484164834754707])
+
+
+  def test_fingerprints_indexed_for_older_databases(self):
+    """Test that a database stored before fingerprints were kept has them indexed when it's next opened."""
+    self.history_store.append_partition("statement_1.csv", self.statement_df)
+    connection = self.history_store.connection()
+    with connection:
+      connection.execute("DELETE FROM fingerprints")
+      connection.execute("PRAGMA user_version = 0")
+    self.history_store.close()
+
+    fingerprints = HistoryStore.fingerprints(self.statement_df)
+    self.assertEqual(self.history_store.stored_counts(fingerprints), {fingerprint: 1 for fingerprint in fingerprints})
+
+
+  def test_reclassify_unknown_transactions(self):
+    """Test that Unknown transactions are moved by normalized name, reporting the statements they came from."""
+    unknown_df = self.statement_df.assign(TransType=["Unknown", "Unknown", "Income"], TransName=["Petsmart  Inc. 0919", "ODDS BAR", "ODDS BAR"])
+    self.history_store.append_partition("statement_1.csv", unknown_df)
+    self.history_store.append_partition("statement_2.csv", self.statement_df)
+
+    sources = self.history_store.reclassify({"PETSMART INC. 0919": "Arya"})
+    self.assertEqual(sources, ["statement_1.csv"])
+    self.assertEqual(list(self.history_store.read(sources=["statement_1.csv"])["TransType"]), ["Arya", "Unknown", "Income"])
+
+
+if __name__ == '__main__':
+  unittest.main()
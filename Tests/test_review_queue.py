@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+from review_queue import ReviewQueue
+
+
+class TestReviewQueue(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.review_queue_file = os.path.join(self.temp_dir.name, "OutputFiles", "review_queue.json")
+    self.unresolved_df = pd.DataFrame({
+      "Date": pd.to_datetime(["2024-01-15", "2024-01-20", "2024-02-03"]),
+      "TransName": ["Lookout Sports Lounge", "LOOKOUT  SPORTS LOUNGE ", "CORNER STORE"],
+      "Debit": [25.0, 30.0, None],
+      "Credit": [None, None, 5.0],
+    })
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+
+  def test_unknowns_are_deduplicated(self):
+    """Test that spelling variants of the same merchant are queued once, counting every occurrence."""
+    review_queue = ReviewQueue(self.review_queue_file)
+    review_queue.add_unresolved("statement_1.csv", self.unresolved_df)
+    review_queue.add_unresolved("statement_2.csv", self.unresolved_df.iloc[:1])
+
+    pending = dict(review_queue.pending())
+    self.assertEqual(list(pending), ["LOOKOUT SPORTS LOUNGE", "CORNER STORE"])
+    self.assertEqual(pending["LOOKOUT SPORTS LOUNGE"]["Count"], 3)
+    self.assertEqual(pending["LOOKOUT SPORTS LOUNGE"]["TransNames"], ["Lookout Sports Lounge", "LOOKOUT  SPORTS LOUNGE "])
+    self.assertEqual(pending["CORNER STORE"]["Credit"], 5.0)
+
+
+  def test_resolved_entries_are_applied_next_run(self):
+    """Test that categories filled in on the written queue are picked up, and invalid ones stay queued."""
+    review_queue = ReviewQueue(self.review_queue_file)
+    review_queue.add_unresolved("statement_1.csv", self.unresolved_df)
+    review_queue.resolve("LOOKOUT SPORTS LOUNGE", "Booze")
+    review_queue.resolve("CORNER STORE", "Not A Category")
+    review_queue.write()
+
+    review_queue = ReviewQueue(self.review_queue_file)
+    resolved = review_queue.pop_resolved(["Booze", "Groceries"])
+    self.assertEqual(list(resolved), ["LOOKOUT SPORTS LOUNGE"])
+    self.assertEqual(list(review_queue.entries), ["CORNER STORE"])
+
+    review_queue.entries.clear()
+    review_queue.write()
+    self.assertFalse(os.path.exists(self.review_queue_file))
+
+
+  def test_write_keeps_answers_filled_in_on_the_file(self):
+    """Test that categories filled in on the file since it was read aren't written over."""
+    review_queue = ReviewQueue(self.review_queue_file)
+    review_queue.add_unresolved("statement_1.csv", self.unresolved_df)
+    review_queue.write()
+
+    with open(self.review_queue_file, "r") as rqf:
+      file_entries = json.load(rqf)
+    file_entries["CORNER STORE"]["TransType"] = "Groceries"
+    with open(self.review_queue_file, "w") as rqf:
+      json.dump(file_entries, rqf)
+
+    review_queue.add_unresolved("statement_2.csv", self.unresolved_df.iloc[:1])
+    review_queue.write()
+
+    resolved = ReviewQueue(self.review_queue_file).pop_resolved(["Groceries"])
+    self.assertEqual(resolved["CORNER STORE"]["TransType"], "Groceries")
+
+
+if __name__ == '__main__':
+  unittest.main()
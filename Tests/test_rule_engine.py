@@ -0,0 +1,54 @@
+import unittest
+import pandas as pd
+from rule_engine import RuleEngine
+
+
+class TestRuleEngine(unittest.TestCase):
+
+  def setUp(self):
+    self.rule_engine = RuleEngine.from_file("categorization_rules.json")
+    self.statement_df = pd.DataFrame({
+      "TransName": ["TFR-TO C/C 1234", "AMZN MKTP CA", "AMZN MKTP CA", "EDWARD JONES", "EDWARD JONES", "NOFRILLS 3311", "CORNER STORE"],
+      "Debit": [500.0, 40.0, 120.0, 1750.0, 1250.0, None, 12.0],
+      "Credit": [None, None, None, None, None, 30.0, None],
+    })
+
+
+  def test_rules_file(self):
+    """Test that the shipped rules categorize the special cases main() used to hard-code."""
+    rule_trans_types, remember = self.rule_engine.apply(self.statement_df)
+
+    self.assertEqual(
+      list(rule_trans_types),
+      ["Ignore", "House Purchases", None, "Raj Joint", "RRSP Adam", "Groceries", None]
+    )
+    self.assertEqual(list(remember), [False, False, False, False, False, True, False])
+
+
+  def test_priority_and_predicates(self):
+    """Test that the lowest priority matching rule wins and amount predicates are inclusive."""
+    rule_engine = RuleEngine([
+      {"regex": "^AMZN", "category": "Big Purchases", "priority": 2},
+      {"contains": "amzn", "ignore_case": True, "amount_max": 120, "category": "House Purchases", "priority": 1},
+    ])
+    rule_trans_types, _ = rule_engine.apply(self.statement_df)
+
+    self.assertEqual(list(rule_trans_types[1:3]), ["House Purchases", "House Purchases"])
+
+    rule_engine = RuleEngine([{"contains": "AMZN", "amount_min": 120.01, "category": "Big Purchases"}])
+    rule_trans_types, _ = rule_engine.apply(self.statement_df)
+    self.assertEqual(list(rule_trans_types[1:3]), [None, None])
+
+
+  def test_invalid_rules(self):
+    """Test that malformed rules are rejected when they are loaded."""
+    with self.assertRaises(ValueError):
+      RuleEngine([{"contains": "AMZN"}])
+    with self.assertRaises(ValueError):
+      RuleEngine([{"contains": "AMZN", "regex": "AMZN", "category": "Ignore"}])
+    with self.assertRaises(ValueError):
+      RuleEngine([{"contains": "AMZN", "category": "Ignore", "debit_below": 5}])
+
+
+if __name__ == '__main__':
+  unittest.main()
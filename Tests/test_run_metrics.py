@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from run_metrics import RunMetrics
+
+
+class TestRunMetrics(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.run_report_file = os.path.join(self.temp_dir.name, "OutputFiles", "run_report.json")
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+
+  def test_stages_and_rates(self):
+    """Test that stages are totalled overall and per statement, with hit rates over every categorized transaction."""
+    run_metrics = RunMetrics(self.run_report_file)
+    with run_metrics.stage("read", "statement_1.csv") as stage_metrics:
+      stage_metrics["rows"] = 10
+    run_metrics.record_stage("read", 0.5, 30, "statement_2.csv")
+    run_metrics.count("cache_hits", 32, "statement_1.csv")
+    run_metrics.count("rule_hits", 4, "statement_1.csv")
+    run_metrics.count("unknowns", 4, "statement_2.csv")
+
+    report = run_metrics.report()
+    self.assertEqual(report["stages"]["read"]["rows"], 40)
+    self.assertEqual(report["stages"]["read"]["calls"], 2)
+    self.assertAlmostEqual(report["cache_hit_rate"], 0.8)
+    self.assertAlmostEqual(report["unknown_rate"], 0.1)
+    self.assertEqual(report["statements"]["statement_2.csv"]["stages"]["read"]["rows_per_second"], 60)
+    self.assertEqual(report["statements"]["statement_2.csv"]["unknown_rate"], 1)
+
+
+  def test_merge_worker_metrics(self):
+    """Test that a worker's metrics are folded in, leaving its counts out when the statement was matched again."""
+    run_metrics = RunMetrics()
+    worker_metrics = RunMetrics()
+    worker_metrics.record_stage("categorize", 0.25, 100, "statement_1.csv")
+    worker_metrics.count("cache_hits", 100, "statement_1.csv")
+
+    run_metrics.merge(worker_metrics)
+    run_metrics.merge(worker_metrics, include_counts=False)
+
+    self.assertEqual(run_metrics.stages["categorize"], {"seconds": 0.5, "rows": 200, "calls": 2})
+    self.assertEqual(run_metrics.counts, {"cache_hits": 100})
+    self.assertEqual(run_metrics.statements["statement_1.csv"]["counts"], {"cache_hits": 100})
+
+
+  def test_write(self):
+    """Test that the run report is written as JSON, creating the output directory."""
+    run_metrics = RunMetrics(self.run_report_file)
+    run_metrics.record_stage("output", 1.0, 5)
+    run_metrics.write()
+
+    with open(self.run_report_file, 'r') as rrf:
+      report = json.load(rrf)
+    self.assertEqual(report["stages"]["output"]["rows_per_second"], 5)
+    self.assertFalse(os.path.exists(self.run_report_file + ".tmp"))
+
+
+if __name__ == '__main__':
+  unittest.main()
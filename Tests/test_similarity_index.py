@@ -0,0 +1,47 @@
+import unittest
+from similarity_index import SimilarityIndex, similarity_key
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.similarity_index = SimilarityIndex({
+      "Arya": ["PETSMART INC. 0919", "PET VALU #123"],
+      "Booze": ["LOOKOUT SPORTS LOUNGE", "ODDS BAR"],
+      "Dine Out": ["LOOKOUT BURGER BAR"],
+      "Unknown": ["MYSTERY MERCHANT"],
+    })
+
+
+  def test_similarity_key(self):
+    """Test that store numbers, punctuation, case and spacing are ignored when comparing names."""
+    self.assertEqual(similarity_key("PETSMART INC. 1965"), "PETSMART INC")
+    self.assertEqual(similarity_key("Lookout  Sports Lounge"), "LOOKOUT SPORTS LOUNGE")
+    self.assertEqual(similarity_key("0919"), "0919")
+    self.assertIsNone(similarity_key(None))
+
+
+  def test_suggestions_ranked(self):
+    """Test that variants of a stored name suggest its category first, with the closest stored name."""
+    self.assertEqual(self.similarity_index.suggest("PETSMART INC. 1965"), [("Arya", 1.0, "PETSMART INC")])
+
+    suggestions = self.similarity_index.suggest("LOOKOUT SPORTS BAR")
+    self.assertEqual([trans_type for trans_type, _, _ in suggestions], ["Booze", "Dine Out"])
+    self.assertEqual(suggestions[0][2], "LOOKOUT SPORTS LOUNGE")
+    self.assertGreater(suggestions[0][1], suggestions[1][1])
+
+    self.assertEqual(self.similarity_index.suggest("ZZZZ"), [])
+    self.assertEqual(self.similarity_index.suggest("MYSTERY MERCHANT"), [])
+
+
+  def test_best_match_threshold(self):
+    """Test that a category is only assigned when the best suggestion reaches the threshold."""
+    self.assertEqual(self.similarity_index.best_match("Petsmart Inc. 2001", 0.9), "Arya")
+    self.assertIsNone(self.similarity_index.best_match("LOOKOUT SPORTS BAR", 0.9))
+
+    self.similarity_index.add("LOOKOUT SPORTS BAR 12", "Booze")
+    self.assertEqual(self.similarity_index.best_match("LOOKOUT SPORTS BAR", 0.9), "Booze")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from statement_manifest import StatementManifest
+
+
+class TestStatementManifest(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.manifest_file = os.path.join(self.temp_dir.name, "OutputFiles", "processed_manifest.json")
+    self.statement_file = os.path.join(self.temp_dir.name, "statement.csv")
+    with open(self.statement_file, "w") as sf:
+      sf.write("01/15/2024,PETSMART INC. 0919,25.00,,100.00\n")
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+
+  def test_unchanged_statement_is_skipped(self):
+    """Test that a recorded statement is recognized across runs, even if only its mtime changes."""
+    manifest = StatementManifest(self.manifest_file)
+    self.assertFalse(manifest.is_unchanged("statement.csv", self.statement_file))
+
+    manifest.record("statement.csv", self.statement_file, [["Arya", 2024, 1, 25.0]])
+    manifest.write()
+
+    manifest = StatementManifest(self.manifest_file)
+    self.assertTrue(manifest.is_unchanged("statement.csv", self.statement_file))
+    self.assertEqual(manifest.totals("statement.csv"), [["Arya", 2024, 1, 25.0]])
+
+    os.utime(self.statement_file, ns=(0, 0))
+    self.assertTrue(manifest.is_unchanged("statement.csv", self.statement_file))
+
+
+  def test_modified_statement_is_reprocessed(self):
+    """Test that a recorded statement is processed again once its content changes."""
+    manifest = StatementManifest(self.manifest_file)
+    manifest.record("statement.csv", self.statement_file, [["Arya", 2024, 1, 25.0]])
+
+    with open(self.statement_file, "a") as sf:
+      sf.write("01/16/2024,PETSMART INC. 0919,5.00,,95.00\n")
+
+    self.assertFalse(manifest.is_unchanged("statement.csv", self.statement_file))
+
+
+if __name__ == '__main__':
+  unittest.main()
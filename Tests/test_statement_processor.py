@@ -1,10 +1,16 @@
 import unittest
 import os
 import configparser
+import io
+import tempfile
 import pandas as pd
+import statement_processor
 from statement_processor import StatementProcessor
 
 class TestStatementProcessor(unittest.TestCase):
+  # The config keys of the files a run keeps between runs, and the names to give them in each test's own directory
+  history_files = {"history_db_file": "transaction_history.db", "processed_manifest_file": "processed_manifest.json", "review_queue_file": "review_queue.json"}
+
   @classmethod
   def setUpClass(cls):
     # Load config
@@ -14,9 +20,31 @@ class TestStatementProcessor(unittest.TestCase):
     cls.config = configparser.ConfigParser()
     cls.config.read('config.ini')
 
+    # Compile the transaction cache into a temp directory rather than the working tree's OutputFiles
+    cls.compiled_cache_dir = tempfile.TemporaryDirectory()
+    cls.compiled_cache_file = statement_processor.config["OUTPUT FILES"]["compiled_cache_file"]
+    statement_processor.config["OUTPUT FILES"]["compiled_cache_file"] = os.path.join(cls.compiled_cache_dir.name, "compiled_transaction_cache.pickle")
+
     # Initialize StatementProcessor instance
     cls.processor = StatementProcessor()
 
+  @classmethod
+  def tearDownClass(cls):
+    statement_processor.config["OUTPUT FILES"]["compiled_cache_file"] = cls.compiled_cache_file
+    cls.compiled_cache_dir.cleanup()
+
+  def setUp(self):
+    # Each test keeps its own history, manifest and review queue, so nothing stored by earlier runs carries over,
+    # ex. rows dropped as duplicates or statements skipped as already processed
+    self.history_dir = tempfile.TemporaryDirectory()
+    for config_key, file_name in self.history_files.items():
+      statement_processor.config["OUTPUT FILES"][config_key] = os.path.join(self.history_dir.name, file_name)
+
+  def make_processor(self, statements_dir):
+    processor = StatementProcessor()
+    processor.statements_path = statements_dir
+    return processor
+
 
   def test_config_values(self):
     """Test that config.ini has the correct sections and key-value pairs."""
@@ -87,11 +115,239 @@ class TestStatementProcessor(unittest.TestCase):
     self.assertIsInstance(cache, dict, "Expected cache to be a dictionary.")
 
 
+  def test_categorize_statement(self):
+    """Test that known transactions are categorized from the cache and unknown ones are left for the slow path."""
+    statement_df = pd.DataFrame({
+      "Date": ["01/15/2024", "02/03/2024", "02/20/2024"],
+      "TransName": ["PETSMART INC. 0919", "NOT A STORED MERCHANT", "PETSMART INC. 0919"],
+      "Debit": [25.0, 10.0, None],
+      "Credit": [None, None, 5.0],
+      "CurTot": [100.0, 90.0, 95.0],
+    })
+
+    categorized_df = self.processor.categorize_statement(statement_df)
+    self.assertEqual(list(categorized_df["TransType"].isna()), [False, True, False])
+    self.assertEqual(categorized_df.at[0, "TransType"], "Arya")
+
+
+  def test_signed_cents(self):
+    """Test that debits count as spending, credits against it, and Income credits are summed as-is, in cents."""
+    statement_df = pd.DataFrame({
+      "Debit": [25.0, None, None],
+      "Credit": [None, 5.0, 1000.0],
+      "TransType": ["Arya", "Arya", "Income"],
+    })
+
+    amounts = self.processor.signed_cents(statement_df)
+    self.assertEqual(list(amounts), [2500, -500, 100000])
+
+
+  def test_categorize_and_aggregate(self):
+    """Test that a statement is categorized and totalled the same from a dataframe, bytes, a stream or in batches."""
+    statement_csv = (
+      "01/15/2024,PETSMART INC. 0919,25.00,,100.00\n"
+      "02/03/2024,NOT A STORED MERCHANT,10.00,,90.00\n"
+      "02/20/2024,PETSMART INC. 0919,,5.00,95.00\n"
+    )
+    statement_df = pd.read_csv(io.StringIO(statement_csv), names=["Date", "TransName", "Debit", "Credit", "CurTot"])
+    batches = [statement_df.iloc[:2], io.StringIO(statement_csv.split("\n", 2)[2])]
+    running_totals = self.processor.transaction_totals.combined().copy()
+
+    results = [
+      self.processor.categorize_and_aggregate(statement_df),
+      self.processor.categorize_and_aggregate(statement_csv.encode()),
+      self.processor.categorize_and_aggregate(io.StringIO(statement_csv)),
+      self.processor.categorize_and_aggregate(batches),
+    ]
+
+    for result in results:
+      self.assertEqual(list(result.statement_df["TransType"]), ["Arya", "Unknown", "Arya"])
+      self.assertEqual(list(result.unresolved_df["TransName"]), ["NOT A STORED MERCHANT"])
+      self.assertEqual(result.statement_df["TransName"].dtype, "category")
+      self.assertEqual(list(result.statement_df["AmountCents"]), [2500, 1000, -500])
+      self.assertEqual(result.totals[("Arya", 2024, 1)], 2500)
+      self.assertEqual(result.totals[("Arya", 2024, 2)], -500)
+      self.assertEqual(result.totals[("Unknown", 2024, 2)], 1000)
+
+    self.assertNotIn("TransType", statement_df.columns)
+    pd.testing.assert_series_equal(self.processor.transaction_totals.combined(), running_totals)
+
+
+  def test_auto_assign_similar_names(self):
+    """Test that unknown names close enough to a stored name are put in its category and remembered, the rest stay unknown."""
+    processor = StatementProcessor()
+    processor.auto_assign_similarity = 0.9
+    statement_df = pd.DataFrame({
+      "Date": ["01/15/2024", "01/16/2024", "01/17/2024"],
+      "TransName": ["PETSMART INC. 2001", "NOT A STORED MERCHANT", "Petsmart Inc. 2001"],
+      "Debit": [25.0, 10.0, 5.0], "Credit": [None, None, None], "CurTot": [100.0, 90.0, 85.0],
+    })
+
+    result = processor.categorize_and_aggregate(statement_df)
+
+    self.assertEqual(list(result.statement_df["TransType"]), ["Arya", "Unknown", "Arya"])
+    self.assertEqual(processor.transaction_matcher.match("PETSMART INC. 2001"), "Arya")
+    self.assertEqual(processor.run_metrics.counts["similarity_hits"], 2)
+
+
+  def test_process_statement_file_streamed(self):
+    """Test that streaming a statement in chunks stores and totals it the same as reading it whole."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      with open(os.path.join(temp_dir, "statement_1.csv"), "w") as sf:
+        sf.write("01/15/2024,PETSMART INC. 0919,25.00,,100.00\n")
+        sf.write("01/20/2024,NOT A STORED MERCHANT,10.00,,90.00\n")
+        sf.write("02/03/2024,PETSMART INC. 0919,,5.00,95.00\n")
+        sf.write("02/20/2024,TFR-TO C/C,,50.00,145.00\n")
+        sf.write("03/01/2024,NOT A STORED MERCHANT,2.50,,142.50\n")
+
+      processor = self.make_processor(temp_dir)
+
+      processor.process_statement_files(["statement_1.csv"], chunk_rows=2)
+      expected = processor.categorize_and_aggregate(os.path.join(temp_dir, "statement_1.csv"))
+
+      stored_df = processor.history_store.read(sources=["statement_1.csv"])
+      processor.history_store.close()
+
+    self.assertEqual(list(stored_df["TransType"]), list(expected.statement_df["TransType"]))
+    pd.testing.assert_series_equal(processor.transaction_totals.partials["statement_1.csv"], expected.totals)
+    self.assertEqual(processor.review_queue.entries["NOT A STORED MERCHANT"]["Count"], 2)
+    self.assertEqual(list(processor.processed_statements), ["statement_1.csv"])
+
+
+  def test_streamed_day_first_dates(self):
+    """Test that streaming a day-first statement reads its dates as reading it whole does, though the first chunk fits month-first too."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      with open(os.path.join(temp_dir, "statement_1.csv"), "w") as sf:
+        sf.write("05/02/2024,PETSMART INC. 0919,25.00,,100.00\n")
+        sf.write("06/02/2024,PETSMART INC. 0919,10.00,,90.00\n")
+        sf.write("20/02/2024,PETSMART INC. 0919,5.00,,85.00\n")
+
+      processor = self.make_processor(temp_dir)
+
+      processor.process_statement_files(["statement_1.csv"], chunk_rows=2)
+      expected = processor.categorize_and_aggregate(os.path.join(temp_dir, "statement_1.csv"))
+      stored_df = processor.history_store.read(sources=["statement_1.csv"])
+      processor.history_store.close()
+
+    self.assertEqual(list(stored_df["Date"].astype(str)), ["2024-02-05", "2024-02-06", "2024-02-20"])
+    self.assertEqual(list(expected.statement_df["Date"]), list(pd.to_datetime(stored_df["Date"])))
+    pd.testing.assert_series_equal(processor.transaction_totals.partials["statement_1.csv"], expected.totals)
+
+
+  def test_outputs_only_statements_processed_since_last_written(self):
+    """Test that each csv of categorized transactions holds the statements processed since the one before."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      with open(os.path.join(temp_dir, "statement_1.csv"), "w") as sf:
+        sf.write("01/15/2024,PETSMART INC. 0919,25.00,,100.00\n")
+      with open(os.path.join(temp_dir, "statement_2.csv"), "w") as sf:
+        sf.write("02/03/2024,PETSMART INC. 0919,10.00,,90.00\n")
+
+      processor = self.make_processor(temp_dir)
+      processor.output_dir = temp_dir
+      processor.historic_transactions_db_csv = os.path.join(temp_dir, "categorized_transactions.csv")
+      processor.categorized_transactions_file = os.path.join(temp_dir, "categorized_transactions_run.csv")
+
+      processor.process_statement_files(["statement_1.csv"])
+      processor.process_statement_files(["statement_1.csv"])
+      processor.write_categorized_transactions_csv()
+      first_df = pd.read_csv(processor.categorized_transactions_file)
+      first_file = processor.categorized_transactions_file
+
+      processor.write_categorized_transactions_csv()
+      self.assertEqual(processor.categorized_transactions_file, first_file)
+
+      processor.process_statement_files(["statement_2.csv"])
+      processor.write_categorized_transactions_csv()
+      second_df = pd.read_csv(processor.categorized_transactions_file)
+      processor.history_store.close()
+
+    self.assertEqual(list(processor.processed_statements), ["statement_1.csv", "statement_2.csv"])
+    self.assertEqual(len(first_df), 1)
+    self.assertNotEqual(processor.categorized_transactions_file, first_file)
+    self.assertEqual(len(second_df), 1)
+
+
+  def test_overlapping_statements_are_deduplicated(self):
+    """Test that transactions already stored from an overlapping statement are dropped, keeping genuine repeats."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      with open(os.path.join(temp_dir, "statement_1.csv"), "w") as sf:
+        sf.write("01/15/2024,PETSMART INC. 0919,25.00,,100.00\n")
+        sf.write("01/20/2024,PETSMART INC. 0919,10.00,,90.00\n")
+      with open(os.path.join(temp_dir, "statement_2.csv"), "w") as sf:
+        sf.write("01/20/2024,PETSMART  INC. 0919,10.00,,90.00\n")
+        sf.write("01/20/2024,PETSMART INC. 0919,10.00,,90.00\n")
+        sf.write("01/20/2024,PETSMART INC. 0919,10.00,,80.00\n")
+        sf.write("02/03/2024,PETSMART INC. 0919,,5.00,85.00\n")
+
+      processor = self.make_processor(temp_dir)
+
+      processor.process_statement_files(["statement_1.csv", "statement_2.csv"])
+      processor.process_statement_files(["statement_2.csv"], chunk_rows=1)
+      stored_df = processor.history_store.read(sources=["statement_2.csv"])
+      processor.history_store.close()
+
+    # The first copy of the 01/20 transaction is already stored, the same-day repeats are kept
+    self.assertEqual(list(stored_df["CurTot"]), [90.0, 80.0, 85.0])
+    self.assertEqual(processor.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 55.0)
+    self.assertEqual(processor.run_metrics.counts["duplicates"], 2)
+
+
+  def test_categorize_statements_parallel(self):
+    """Test that categorizing across worker processes gives the same results, in file order, as one process."""
+    with tempfile.TemporaryDirectory() as statements_dir:
+      statement_file_names = []
+      for file_index in range(3):
+        statement_file_name = f"statement_{file_index}.csv"
+        with open(os.path.join(statements_dir, statement_file_name), "w") as sf:
+          sf.write(f"01/0{file_index + 1}/2024,PETSMART INC. 0919,25.00,,100.00\n")
+          sf.write(f"01/0{file_index + 1}/2024,TFR-TO C/C {file_index},,50.00,150.00\n")
+        statement_file_names.append(statement_file_name)
+
+      processor = self.make_processor(statements_dir)
+      serial_results = list(processor.categorize_statements(statement_file_names, workers=1))
+      parallel_results = list(processor.categorize_statements(statement_file_names, workers=2))
+      processor.history_store.close()
+
+    self.assertEqual([file_name for file_name, _ in parallel_results], statement_file_names)
+    for (_, serial_df), (_, parallel_df) in zip(serial_results, parallel_results):
+      pd.testing.assert_frame_equal(serial_df, parallel_df)
+      self.assertEqual(list(parallel_df["TransType"]), ["Arya", "Ignore"])
+
+
+  def test_parallel_rematches_only_newly_remembered_names(self):
+    """Test that rows with a name remembered during a parallel batch are matched again and counted as in one process."""
+    with tempfile.TemporaryDirectory() as statements_dir:
+      statement_file_names = []
+      for file_index in range(3):
+        statement_file_name = f"statement_{file_index}.csv"
+        with open(os.path.join(statements_dir, statement_file_name), "w") as sf:
+          sf.write(f"01/0{file_index + 1}/2024,NOFRILLS 1234,25.00,,100.00\n")
+          sf.write(f"01/0{file_index + 1}/2024,PETSMART INC. 0919,10.00,,90.00\n")
+        statement_file_names.append(statement_file_name)
+
+      run_metrics = []
+      for workers in [1, 2]:
+        processor = self.make_processor(statements_dir)
+        results = list(processor.categorize_statements(statement_file_names, workers=workers))
+        processor.history_store.close()
+        run_metrics.append(processor.run_metrics)
+
+    for _, statement_df in results:
+      self.assertEqual(list(statement_df["TransType"]), ["Groceries", "Arya"])
+    self.assertEqual(run_metrics[1].counts, run_metrics[0].counts)
+    self.assertEqual(run_metrics[1].counts["rule_hits"], 1)
+    self.assertEqual(run_metrics[1].stages["categorize"]["rows"], 6)
+
+
   def tearDown(self):
       # Additional cleanup to restore the config file if needed
       if os.path.exists(self.temp_config_path):
           os.rename(self.temp_config_path, self.config_path)
 
+      for config_key in self.history_files:
+        statement_processor.config["OUTPUT FILES"][config_key] = self.config["OUTPUT FILES"][config_key]
+      self.history_dir.cleanup()
+
 
 if __name__ == '__main__':
     unittest.main()
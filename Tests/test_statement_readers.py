@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from statement_readers import STATEMENT_COLUMNS, StatementLayout, StatementReader, fastest_engine
+
+
+class TestStatementReader(unittest.TestCase):
+
+  def setUp(self):
+    self.statement_reader = StatementReader(engine="c")
+
+
+  def test_headerless_layout(self):
+    """Test that the headerless Date, TransName, Debit, Credit, CurTot export is read as it always has been."""
+    statement_df, date_format = self.statement_reader.read(b"01/15/2024,PETSMART INC. 0919,25.00,,100.00\n01/20/2024,GEOTAB INC. PAY,,2500.00,2600.00\n")
+
+    self.assertEqual(list(statement_df.columns), STATEMENT_COLUMNS)
+    self.assertEqual(list(statement_df["Date"]), ["01/15/2024", "01/20/2024"])
+    self.assertEqual(statement_df.at[0, "Debit"], 25.0)
+    self.assertTrue(pd.isna(statement_df.at[0, "Credit"]))
+    self.assertEqual(statement_df.at[1, "CurTot"], 2600.0)
+    self.assertIsNone(date_format)
+
+
+  def test_headerless_layout_with_any_dates(self):
+    """Test that five headerless columns are read as the original export whatever the dates look like, fewer only with known dates."""
+    statement_df, _ = self.statement_reader.read(b"2024.01.15,PETSMART INC. 0919,25.00,,100.00\n")
+    self.assertEqual(list(statement_df["Date"]), ["2024.01.15"])
+    self.assertEqual(statement_df.at[0, "CurTot"], 100.0)
+
+    with self.assertRaises(ValueError):
+      self.statement_reader.read(b"2024.01.15,PETSMART INC. 0919,-25.00\n")
+
+
+  def test_header_layout_with_signed_amounts(self):
+    """Test that a headed export in another column order, delimiter and sign convention is mapped to the statement columns."""
+    statement_csv = "Balance;Description;Posted Date;Amount\n100.00;PETSMART INC. 0919;2024-01-15;-25.00\n2600.00;GEOTAB INC. PAY;2024-01-20;2500.00\n"
+    statement_df, _ = self.statement_reader.read(statement_csv.encode())
+
+    self.assertEqual(list(statement_df["TransName"]), ["PETSMART INC. 0919", "GEOTAB INC. PAY"])
+    self.assertEqual(list(statement_df["Date"]), ["2024-01-15", "2024-01-20"])
+    self.assertEqual(statement_df.at[0, "Debit"], 25.0)
+    self.assertEqual(statement_df.at[1, "Credit"], 2500.0)
+    self.assertTrue(pd.isna(statement_df.at[1, "Debit"]))
+    self.assertEqual(list(statement_df["CurTot"]), [100.0, 2600.0])
+
+
+  def test_layout_cached_per_source(self):
+    """Test that a file is sniffed once, and again only once its first line changes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      statement_file_path = os.path.join(temp_dir, "statement_1.csv")
+      with open(statement_file_path, "w") as sf:
+        sf.write("01/15/2024,PETSMART INC. 0919,25.00,,100.00\n")
+
+      with mock.patch.object(self.statement_reader, "sniff", wraps=self.statement_reader.sniff) as sniff:
+        self.statement_reader.read(statement_file_path)
+        self.statement_reader.read(statement_file_path)
+        self.assertEqual(sniff.call_count, 1)
+
+        with open(statement_file_path, "w") as sf:
+          sf.write("Date,Description,Amount\n01/15/2024,PETSMART INC. 0919,-25.00\n")
+        statement_df, _ = self.statement_reader.read(statement_file_path)
+        self.assertEqual(sniff.call_count, 2)
+
+    self.assertEqual(statement_df.at[0, "Debit"], 25.0)
+
+
+  def test_registered_layout_and_chunks(self):
+    """Test that a registered sniffer is tried first, and its layout is used to read a file in chunks."""
+    self.statement_reader.register(lambda sample_rows, delimiter: StatementLayout(
+      "export_with_id", {"Date": 1, "TransName": 2, "Debit": 3, "Credit": 4, "CurTot": 5}, delimiter=delimiter, date_format="%Y%m%d"
+    ) if sample_rows[0][0].startswith("TX") else None)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      statement_file_path = os.path.join(temp_dir, "statement_1.csv")
+      with open(statement_file_path, "w") as sf:
+        sf.write("TX1,20240115,PETSMART INC. 0919,25.00,,100.00\nTX2,20240120,ODDS BAR,10.00,,90.00\nTX3,20240121,ODDS BAR,5.00,,85.00\n")
+      chunks = list(self.statement_reader.read_chunks(statement_file_path, 2))
+
+    self.assertEqual([len(statement_df) for statement_df, _ in chunks], [2, 1])
+    self.assertEqual(chunks[0][1], "%Y%m%d")
+    self.assertEqual(list(chunks[1][0]["TransName"]), ["ODDS BAR"])
+
+
+  @unittest.skipIf(fastest_engine() != "pyarrow", "pyarrow isn't installed")
+  def test_pyarrow_engine(self):
+    """Test that the default pyarrow engine reads headerless, headed and registered layouts the same as the c engine."""
+    statement_csvs = [
+      b"01/15/2024,PETSMART INC. 0919,25.00,,100.00\n01/20/2024,GEOTAB INC. PAY,,2500.00,2600.00\n",
+      b"Balance;Description;Posted Date;Amount\n100.00;PETSMART INC. 0919;2024-01-15;-25.00\n",
+      b"TX1,20240115,PETSMART INC. 0919,25.00,,100.00\nTX2,20240120,ODDS BAR,10.00,,90.00\n",
+    ]
+    pyarrow_reader = StatementReader()
+    for statement_reader in [pyarrow_reader, self.statement_reader]:
+      statement_reader.register(lambda sample_rows, delimiter: StatementLayout(
+        "export_with_id", {"Date": 1, "TransName": 2, "Debit": 3, "Credit": 4, "CurTot": 5}, delimiter=delimiter
+      ) if sample_rows[0][0].startswith("TX") else None)
+
+    self.assertEqual(pyarrow_reader.engine, "pyarrow")
+    for statement_csv in statement_csvs:
+      statement_df, _ = pyarrow_reader.read(statement_csv)
+      expected_df, _ = self.statement_reader.read(statement_csv)
+      pd.testing.assert_frame_equal(statement_df, expected_df)
+
+
+  def test_unrecognized_layout(self):
+    """Test that a statement in no known layout is reported rather than read wrongly."""
+    with self.assertRaises(ValueError):
+      self.statement_reader.read(b"not,a,statement\nat,all,here\n")
+
+
+if __name__ == '__main__':
+  unittest.main()
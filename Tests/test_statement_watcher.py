@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from review_queue import ReviewQueue
+from statement_watcher import StatementWatcher
+
+
+class TestStatementWatcher(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.processor = MagicMock()
+    self.processor.statements_path = self.temp_dir.name
+    # Stand in for the manifest, files are pending until processed
+    self.processed = set()
+    self.processor.pending_statement_files.side_effect = lambda statement_file_names: [
+      statement_file_name for statement_file_name in statement_file_names if statement_file_name not in self.processed
+    ]
+    self.processor.process_statement_files.side_effect = lambda statement_file_names, **kwargs: self.processed.update(statement_file_names)
+    self.processor.resolve_queued_transactions.return_value = 0
+    self.watcher = StatementWatcher(self.processor, poll_seconds=0, flush_seconds=3600)
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def write_statement(self, statement_file_name, content="01/02/2024,PETSMART INC. 0919,25.00,,100.00\n"):
+    with open(os.path.join(self.temp_dir.name, statement_file_name), "a") as sf:
+      sf.write(content)
+
+  def processed_file_names(self):
+    return [call.args[0][0] for call in self.processor.process_statement_files.call_args_list]
+
+
+  def test_new_files_wait_to_settle(self):
+    """Test that files waiting at startup are processed straight away, and new ones once unchanged for a poll."""
+    self.write_statement("statement_1.csv")
+    self.assertEqual(self.watcher.poll(), 1)
+
+    self.write_statement("statement_2.csv")
+    self.assertEqual(self.watcher.poll(), 0)
+    self.write_statement("statement_2.csv", "01/03/2024,NOFRILLS,12.00,,88.00\n")
+    self.assertEqual(self.watcher.poll(), 0)
+    self.assertEqual(self.watcher.poll(), 1)
+
+    self.assertEqual(self.processed_file_names(), ["statement_1.csv", "statement_2.csv"])
+
+
+  def test_failed_files_retried_once_changed(self):
+    """Test that a file that couldn't be processed is skipped until it changes."""
+    self.write_statement("statement_1.csv")
+    self.processor.process_statement_files.side_effect = ValueError("bad statement")
+    self.assertEqual(self.watcher.poll(), 0)
+    self.assertEqual(self.watcher.poll(), 0)
+    self.assertEqual(self.processor.process_statement_files.call_count, 1)
+
+    self.processor.process_statement_files.side_effect = lambda statement_file_names, **kwargs: self.processed.update(statement_file_names)
+    self.write_statement("statement_1.csv")
+    self.watcher.poll()
+    self.assertEqual(self.watcher.poll(), 1)
+
+
+  def test_outputs_written_in_batches(self):
+    """Test that outputs are only written when something changed, and once more on the way out."""
+    self.watcher.run(max_polls=2)
+    self.processor.write_outputs.assert_not_called()
+
+    self.write_statement("statement_1.csv")
+    self.write_statement("statement_2.csv")
+    self.watcher.run(max_polls=3)
+    self.processor.write_outputs.assert_called_once_with(12)
+    self.assertEqual(self.processor.process_statement_files.call_count, 2)
+
+
+  def test_settled_files_batched_across_workers(self):
+    """Test that files settling together are processed in one batch across workers, and one at a time if it fails."""
+    self.watcher.workers = 2
+    self.write_statement("statement_1.csv")
+    self.write_statement("statement_2.csv")
+    self.assertEqual(self.watcher.poll(), 2)
+    self.processor.process_statement_files.assert_called_once_with(["statement_1.csv", "statement_2.csv"], workers=2, chunk_rows=0)
+
+    def process_batch(statement_file_names, **kwargs):
+      if len(statement_file_names) > 1:
+        self.processed.add(statement_file_names[0])
+        raise ValueError("bad statement")
+      self.processed.update(statement_file_names)
+
+    self.processor.process_statement_files.side_effect = process_batch
+    self.write_statement("statement_3.csv")
+    self.write_statement("statement_4.csv")
+    self.watcher.poll()
+    self.assertEqual(self.watcher.poll(), 2)
+    self.assertEqual(self.processed_file_names()[-1], "statement_4.csv")
+
+
+  def test_broken_review_queue_file(self):
+    """Test that a review queue file broken by a hand edit doesn't stop the watcher or the outputs being written."""
+    review_queue = ReviewQueue(os.path.join(self.temp_dir.name, "OutputFiles", "review_queue.json"))
+    review_queue.entries["CORNER STORE"] = {"TransNames": ["CORNER STORE"], "TransType": None, "Count": 1}
+    review_queue.write()
+    with open(review_queue.review_queue_file, "a") as rqf:
+      rqf.write(",")
+
+    self.processor.review_queue = review_queue
+    self.processor.write_outputs.side_effect = lambda rolling_months: review_queue.write()
+    self.write_statement("statement_1.csv")
+    self.watcher.run(max_polls=1)
+
+    self.processor.write_outputs.assert_called_once_with(12)
+    self.assertEqual(list(ReviewQueue(review_queue.review_queue_file).entries), ["CORNER STORE"])
+
+
+if __name__ == '__main__':
+  unittest.main()
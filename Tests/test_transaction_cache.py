@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from transaction_cache import TransactionCache
+
+
+class TestTransactionCache(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.snapshot_file = os.path.join(self.temp_dir.name, "stored_transaction.json")
+    self.journal_file = os.path.join(self.temp_dir.name, "stored_transaction_journal.jsonl")
+    with open(self.snapshot_file, 'wt') as tsf:
+      json.dump({"BTC": ["SEND E-TFR ***WGW", "SEND E-TFR ***BSB"], "Booze": ["LCBO/RAO #0233"], "Unknown": []}, tsf)
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def read_snapshot(self):
+    with open(self.snapshot_file, 'r') as tsf:
+      return json.load(tsf)
+
+
+  def test_add_deduplicates_by_normalized_name(self):
+    """Test that spacing and case variants of a stored name aren't stored again."""
+    transaction_cache = TransactionCache(self.snapshot_file, self.journal_file)
+
+    self.assertFalse(transaction_cache.add("SEND E-TFR ***WgW   ", "BTC"))
+    self.assertFalse(transaction_cache.add("lcbo/rao  #0233", "Groceries"))
+    self.assertTrue(transaction_cache.add("Merit Brewing", "Booze"))
+    self.assertFalse(transaction_cache.add("MERIT BREWING ", "Booze"))
+
+    self.assertEqual(transaction_cache.trans_type("merit brewing"), "Booze")
+    self.assertEqual(transaction_cache.as_dict()["Booze"], ["LCBO/RAO #0233", "MERIT BREWING"])
+    self.assertEqual(transaction_cache.pending, [("MERIT BREWING", "Booze")])
+
+
+  def test_flush_appends_only_new_names(self):
+    """Test that a flush journals the new names, leaving the snapshot alone, and that they're loaded back."""
+    with open(self.snapshot_file, 'r') as tsf:
+      snapshot_before = tsf.read()
+
+    transaction_cache = TransactionCache(self.snapshot_file, self.journal_file)
+    transaction_cache.flush()
+    self.assertFalse(os.path.exists(self.journal_file))
+
+    transaction_cache.add("MERIT BREWING", "Booze")
+    transaction_cache.add("BITBUY", "Crypto")
+    transaction_cache.flush()
+    transaction_cache.add("ODDS BAR", "Booze")
+    transaction_cache.flush()
+
+    with open(self.snapshot_file, 'r') as tsf:
+      self.assertEqual(tsf.read(), snapshot_before)
+    with open(self.journal_file, 'r') as tjf:
+      self.assertEqual(len(tjf.readlines()), 3)
+
+    reloaded_cache = TransactionCache(self.snapshot_file, self.journal_file)
+    self.assertEqual(reloaded_cache.as_dict()["Booze"], ["LCBO/RAO #0233", "MERIT BREWING", "ODDS BAR"])
+    self.assertEqual(list(reloaded_cache.as_dict()), ["BTC", "Booze", "Unknown", "Crypto"])
+
+
+  def test_compaction(self):
+    """Test that the journal is folded into the snapshot once it reaches compact_after entries."""
+    transaction_cache = TransactionCache(self.snapshot_file, self.journal_file, compact_after=2)
+    transaction_cache.add("MERIT BREWING", "Booze")
+    transaction_cache.flush()
+    self.assertTrue(os.path.exists(self.journal_file))
+
+    transaction_cache.add("ODDS BAR", "Booze")
+    transaction_cache.flush()
+
+    self.assertFalse(os.path.exists(self.journal_file))
+    self.assertEqual(self.read_snapshot()["Booze"], ["LCBO/RAO #0233", "MERIT BREWING", "ODDS BAR"])
+
+
+  def test_stale_snapshot_is_compacted(self):
+    """Test that duplicate and unnormalized names in the snapshot are cleaned up by the next flush."""
+    with open(self.snapshot_file, 'wt') as tsf:
+      json.dump({"Booze": ["Lookout Sports Lounge", "LOOKOUT SPORTS LOUNGE", "ODDS BAR   "]}, tsf)
+
+    TransactionCache(self.snapshot_file, self.journal_file).flush()
+
+    self.assertEqual(self.read_snapshot(), {"Booze": ["LOOKOUT SPORTS LOUNGE", "ODDS BAR"]})
+
+
+  def test_partly_written_journal_entry(self):
+    """Test that an entry cut off by a crash is dropped, and later entries are still appended cleanly."""
+    with open(self.journal_file, 'wt') as tjf:
+      tjf.write(json.dumps({"TransName": "MERIT BREWING", "TransType": "Booze"}) + "\n")
+      tjf.write('{"TransName": "ODDS')
+
+    transaction_cache = TransactionCache(self.snapshot_file, self.journal_file)
+    self.assertEqual(transaction_cache.trans_type("MERIT BREWING"), "Booze")
+    self.assertIsNone(transaction_cache.trans_type("ODDS BAR"))
+
+    transaction_cache.add("ODDS BAR", "Booze")
+    transaction_cache.flush()
+
+    reloaded_cache = TransactionCache(self.snapshot_file, self.journal_file)
+    self.assertEqual(reloaded_cache.trans_type("ODDS BAR"), "Booze")
+    self.assertEqual(reloaded_cache.journal_entries, 2)
+
+
+  def test_build_matcher_reuses_compiled_snapshot(self):
+    """Test that the compiled matcher is reused while the cache is unchanged, and rebuilt once it changes."""
+    compiled_file = os.path.join(self.temp_dir.name, "OutputFiles", "compiled_transaction_cache.pickle")
+    transaction_cache = TransactionCache(self.snapshot_file, self.journal_file)
+    transaction_cache.build_matcher(compiled_file)
+    compiled_mtime = os.stat(compiled_file).st_mtime_ns
+
+    with patch("transaction_cache.TransactionMatcher.__init__") as matcher_init:
+      matcher = TransactionCache(self.snapshot_file, self.journal_file).build_matcher(compiled_file)
+      matcher_init.assert_not_called()
+    self.assertEqual(matcher.match("send e-tfr"), "BTC")
+    self.assertEqual(os.stat(compiled_file).st_mtime_ns, compiled_mtime)
+
+    transaction_cache.add("ODDS BAR", "Booze")
+    transaction_cache.flush()
+    rebuilt_matcher = TransactionCache(self.snapshot_file, self.journal_file).build_matcher(compiled_file)
+    self.assertEqual(rebuilt_matcher.match("ODDS"), "Booze")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from transaction_matcher import TransactionMatcher
+
+
+def scan_categories(trans_stored_cache, trans_name):
+  """The original per-row scan the matcher replaces, used as the reference answer."""
+  for category, transactions in trans_stored_cache.items():
+    if any(trans_name in item for item in transactions):
+      return category
+  return None
+
+
+class TestTransactionMatcher(unittest.TestCase):
+
+  def setUp(self):
+    self.cache = {
+      "Arya": ["PETSMART INC. 0919", "WATZIN VETERINARY CLIN"],
+      "Booze": ["LCBO/RAO #0233", "LOOKOUT SPORTS LOUNGE"],
+      "Groceries": ["FORTINOS #12", "LCBO EXPRESS"],
+      "Unknown": [],
+    }
+    self.matcher = TransactionMatcher(self.cache)
+
+
+  def test_exact_and_substring_matches(self):
+    """Test that exact names and names contained in a stored name resolve to their category."""
+    self.assertEqual(self.matcher.match("PETSMART INC. 0919"), "Arya")
+    self.assertEqual(self.matcher.match("PETSMART"), "Arya")
+    self.assertEqual(self.matcher.match("SPORTS"), "Booze")
+    self.assertIsNone(self.matcher.match("PETSMART INC. 1965"))
+    self.assertIsNone(self.matcher.match(float("nan")))
+
+
+  def test_first_match_wins(self):
+    """Test that a name contained in several categories resolves to the first in cache order."""
+    self.assertEqual(self.matcher.match("LCBO"), scan_categories(self.cache, "LCBO"))
+    self.assertEqual(self.matcher.match("LCBO"), "Booze")
+    self.assertEqual(self.matcher.match("LCBO EXPRESS"), "Groceries")
+
+
+  def test_add_updates_in_place(self):
+    """Test that names added during a run are matched, including over previously resolved lookups."""
+    self.assertEqual(self.matcher.match("EXPRESS"), "Groceries")
+
+    self.matcher.add("EXPRESS PET WASH", "Arya")
+    self.cache["Arya"].append("EXPRESS PET WASH")
+
+    self.assertEqual(self.matcher.match("EXPRESS"), "Arya")
+    self.assertEqual(self.matcher.match("PET WASH"), "Arya")
+
+    for trans_name in ["EXPRESS", "LCBO", "O", "", "ORT", "XYZ", "0233", "INC. 09"]:
+      self.assertEqual(self.matcher.match(trans_name), scan_categories(self.cache, trans_name), trans_name)
+
+
+  def test_normalized_matches(self):
+    """Test that spacing and case variants of a name match the same stored name."""
+    self.matcher.add("SEND E-TFR ***WgW   ", "Arya")
+
+    self.assertEqual(self.matcher.match("send  e-tfr ***wgw"), "Arya")
+    self.assertEqual(self.matcher.match("Lookout Sports Lounge"), "Booze")
+    self.assertEqual(self.matcher.match(" petsmart inc. "), "Arya")
+
+
+  def test_save_and_load(self):
+    """Test that a saved matcher is only loaded back for the cache it was built from."""
+    self.assertEqual(self.matcher.match("SPORTS"), "Booze")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      compiled_file = os.path.join(temp_dir, "OutputFiles", "compiled_transaction_cache.pickle")
+      self.matcher.save(compiled_file, "cache-hash")
+
+      loaded_matcher = TransactionMatcher.load(compiled_file, "cache-hash")
+      self.assertEqual(len(loaded_matcher), len(self.matcher))
+      self.assertEqual(loaded_matcher._exact_index, {})
+      for trans_name in ["PETSMART", "LCBO", "LCBO EXPRESS", "XYZ"]:
+        self.assertEqual(loaded_matcher.match(trans_name), self.matcher.match(trans_name), trans_name)
+
+      self.assertIsNone(TransactionMatcher.load(compiled_file, "other-hash"))
+      self.assertIsNone(TransactionMatcher.load(os.path.join(temp_dir, "missing.pickle"), "cache-hash"))
+
+    self.assertEqual(self.matcher._exact_index["SPORTS"], "Booze")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import pandas as pd
+from transaction_totals import TransactionTotals
+
+
+class TestTransactionTotals(unittest.TestCase):
+
+  def setUp(self):
+    self.transaction_totals = TransactionTotals(["Arya", "Booze", "Income"])
+
+  def partial(self, trans_types, dates, amounts):
+    return TransactionTotals.reduce_statement(pd.Series(trans_types), pd.to_datetime(pd.Series(dates)), pd.Series(amounts))
+
+
+  def test_years_are_kept_apart(self):
+    """Test that the same month in different years lands in different budgets."""
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya", "Arya", "Booze"], ["2023-01-05", "2024-01-09", "2024-01-20"], [1000, 2000, 500]))
+
+    self.assertEqual(self.transaction_totals.years(), [2023, 2024])
+    self.assertEqual(self.transaction_totals.monthly_budget(2023).at["Arya", "Jan"], 10.0)
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 20.0)
+    self.assertTrue(pd.isna(self.transaction_totals.monthly_budget(2023).at["Booze", "Jan"]))
+    self.assertEqual(list(self.transaction_totals.monthly_budget(2024).index), ["Arya", "Booze", "Income"])
+    self.assertEqual(self.transaction_totals.yearly_budget().at["Arya", 2024], 20.0)
+
+
+  def test_statement_update_and_replace(self):
+    """Test that statements add their own cells, and a reprocessed statement replaces its earlier totals."""
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya"], ["2024-01-05"], [1000]))
+    self.transaction_totals.update("statement_2.csv", self.partial(["Arya", "Income"], ["2024-01-07", "2024-02-01"], [500, 10000]))
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 15.0)
+
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya"], ["2024-01-05"], [100]))
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 6.0)
+
+    records = TransactionTotals.to_records(self.transaction_totals.partials["statement_2.csv"])
+    pd.testing.assert_series_equal(TransactionTotals.from_records(records), self.transaction_totals.partials["statement_2.csv"])
+    self.assertTrue(TransactionTotals.is_records(records))
+    self.assertFalse(TransactionTotals.is_records([["Arya", 2024, 1, 5.0]]))
+
+
+  def test_cents_do_not_drift(self):
+    """Test that amounts summed in cents total exactly, where summing the same dollar amounts as floats would not."""
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya"] * 3, ["2024-01-05"] * 3, [10, 20, 30]))
+    self.transaction_totals.update("statement_2.csv", self.partial(["Arya"], ["2024-01-06"], [-60]))
+
+    self.assertEqual(self.transaction_totals.combined().dtype, "int64")
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 0)
+
+
+  def test_replace_then_add(self):
+    """Test that a new statement can be added straight after another statement was replaced."""
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya"], ["2024-01-05"], [1000]))
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya"], ["2024-01-05"], [100]))
+    self.transaction_totals.update("statement_2.csv", self.partial(["Booze"], ["2024-02-07"], [500]))
+    self.transaction_totals.update("statement_3.csv", self.partial(["Arya"], ["2024-01-09"], [200]))
+
+    self.assertEqual(self.transaction_totals.combined().dtype, "int64")
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Arya", "Jan"], 3.0)
+    self.assertEqual(self.transaction_totals.monthly_budget(2024).at["Booze", "Feb"], 5.0)
+
+
+  def test_rolling_budget(self):
+    """Test that the rolling view covers the latest months across the year boundary."""
+    self.transaction_totals.update("statement_1.csv", self.partial(["Arya", "Arya", "Booze"], ["2023-10-05", "2023-12-09", "2024-02-20"], [1000, 2000, 500]))
+
+    rolling_df = self.transaction_totals.rolling_budget(months=3)
+    self.assertEqual(list(rolling_df.columns), ["Dec 2023", "Jan 2024", "Feb 2024"])
+    self.assertEqual(rolling_df.at["Arya", "Dec 2023"], 20.0)
+    self.assertEqual(rolling_df.at["Booze", "Feb 2024"], 5.0)
+
+
+if __name__ == '__main__':
+  unittest.main()
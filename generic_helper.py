@@ -1,28 +1,87 @@
 import configparser
 import datetime
-import json
 import logging
 import os
-import pandas as pd
-import re
 
-from dateutil import parser
+# pandas and dateutil are imported where they're used, so quick commands don't pay for them on launch
 
-# Initialize the configparser
-config = configparser.ConfigParser()
 
-# Load the configuration file
-config.read('config.ini')
+# The config template, holding the default of every setting. config.ini only needs the settings it changes
+CONFIG_TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TemplateFiles", "config_template.ini")
+
+
+class LazyConfig(configparser.ConfigParser):
+  """
+      A ConfigParser that only reads its file the first time a value is asked for
+
+      The config template is read first, so any setting the file leaves out keeps its default from the template.
+  """
+  def __init__(self, config_file, defaults_file=CONFIG_TEMPLATE_FILE):
+    super().__init__()
+    self.config_file = config_file
+    self.defaults_file = defaults_file
+    self._loaded = False
+
+  def _load(self):
+    if not self._loaded:
+      self._loaded = True
+      self.read([self.defaults_file, self.config_file])
+
+  def __getitem__(self, key):
+    self._load()
+    return super().__getitem__(key)
+
+  def get(self, section, option, **kwargs):
+    self._load()
+    return super().get(section, option, **kwargs)
+
+  def has_section(self, section):
+    self._load()
+    return super().has_section(section)
+
+  def sections(self):
+    self._load()
+    return super().sections()
+
+
+# Initialize the configparser, the configuration file is loaded on first use
+config = LazyConfig('config.ini')
 
 # Initialize the logger
 logger = logging.getLogger(__name__)  # This will use the 'genericHelperLogger' settings in logging.conf
 
+# The 3 char shortform of each month, indexed by month number - 1
+MONTH_ABBREVIATIONS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Date layouts seen in bank exports, tried in order when inferring the layout of a statement's Date column
+DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%m/%d/%y", "%d-%b-%Y", "%d %b %Y", "%b %d, %Y", "%Y%m%d"]
+
+
+
+def normalize_trans_name(trans_name):
+  """
+      A function to reduce a transaction name to the form used to tell merchants apart,
+      ignoring case and any runs of whitespace. Ex. "SEND E-TFR ***WgW   " is "SEND E-TFR ***WGW"
+
+      Args:
+      trans_name: {string}    The transaction name
+
+      Returns:
+      normalized_name {str}   The normalized name, None if trans_name isn't a string
+  """
+  if not isinstance(trans_name, str):
+    return None
+  return " ".join(trans_name.split()).upper()
+
 
 class GenericHelper:
   def __init__(self):
     logger.debug("Initializing GenericHelper")
     self.transaction_grid_width = config["DISPLAY"]["keyframe_grid_width"]
 
+    # Memo of date strings parsed one at a time {date_string: datetime}
+    self.parsed_dates = {}
+
 
   def month_parser(self, mp_transaction_date):
     """
@@ -34,13 +93,104 @@ class GenericHelper:
         Returns:
         month_shortform {str}       Value for the 3 char shortform of the month. Ex. December is Dec
     """      
-    parsed_date = parser.parse(mp_transaction_date)
+    parsed_date = self.parse_date(mp_transaction_date)
     month_shortform = datetime.datetime.strftime(parsed_date, "%b")
     logger.debug("Found month {0} from data {1}".format(month_shortform, mp_transaction_date))
     
     return month_shortform
 
 
+  def parse_date(self, transaction_date):
+    """
+        A function to parse a single date, remembering each distinct date string so it's only parsed once
+
+        Args:
+        transaction_date: {string}    String of the date that needs parsing, or an already parsed date
+
+        Returns:
+        parsed_date {datetime}        The parsed date
+    """
+    from dateutil import parser
+
+    if isinstance(transaction_date, (datetime.date, datetime.datetime)):
+      return transaction_date
+
+    parsed_date = self.parsed_dates.get(transaction_date)
+    if parsed_date is None:
+      parsed_date = parser.parse(transaction_date)
+      self.parsed_dates[transaction_date] = parsed_date
+
+    return parsed_date
+
+
+  def infer_date_format(self, date_strings):
+    """
+        A function to find the first known date layout that every one of the given date strings follows
+
+        Args:
+        date_strings: {pd.Series}    Distinct date strings from a statement
+
+        Returns:
+        date_format {str}             The strftime layout of the dates, None if no known layout fits them all
+    """
+    import pandas as pd
+
+    for date_format in DATE_FORMATS:
+      if pd.to_datetime(date_strings, format=date_format, errors="coerce").notna().all():
+        return date_format
+    return None
+
+
+  def parse_dates(self, date_values, date_format=None, infer_format=True):
+    """
+        A function to parse a whole column of dates at once
+
+        The layout is inferred once from the column's distinct values, and the column is parsed in a single pass.
+        Any values that don't follow the inferred layout fall back to being parsed one distinct string at a time.
+
+        Args:
+        date_values: {pd.Series}    The statement's date column
+        date_format: {str}          The layout of the dates if already known, Ex. inferred from the whole of a statement read in chunks
+        infer_format: {bool}        Infer the layout when it isn't given, False to parse every value the slow way, Ex. when
+                                    no layout fits the whole statement
+
+        Returns:
+        parsed_dates {pd.Series}    The dates as a datetime column, NaT where a value couldn't be parsed
+    """
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(date_values):
+      return date_values
+
+    date_strings = date_values.astype(str).str.strip().where(date_values.notna())
+    distinct_dates = pd.Series(date_strings.dropna().unique())
+
+    if date_format is None and infer_format and not distinct_dates.empty:
+      date_format = self.infer_date_format(distinct_dates)
+    logger.debug("Parsing %d dates with layout %s", len(date_values), date_format)
+
+    if date_format is not None:
+      parsed_dates = pd.to_datetime(date_strings, format=date_format, errors="coerce")
+      unparsed = parsed_dates.isna() & date_strings.notna()
+      if not unparsed.any():
+        return parsed_dates
+      # A given layout may not fit every value, parse the ones it missed the slow way
+      distinct_dates = pd.Series(date_strings[unparsed].unique())
+    else:
+      parsed_dates = None
+
+    # No single layout fits, parse each distinct date string once and map the results back onto the column
+    fallback_dates = {}
+    for date_string in distinct_dates:
+      try:
+        fallback_dates[date_string] = self.parse_date(date_string)
+      except (ValueError, OverflowError):
+        logger.warning(f"Couldn't parse the date {date_string}")
+
+    fallback_parsed = pd.to_datetime(date_strings.map(fallback_dates), errors="coerce")
+    return fallback_parsed if parsed_dates is None else parsed_dates.fillna(fallback_parsed)
+
+
   def transaction_grid_builder(self, keys_list):
     """
       A function to build a semi-pretty grid of values, based on the keys of a dictionary
@@ -52,6 +202,7 @@ class GenericHelper:
       keys_df {dataframe}                 This is a dataframe that holds the values
                                           of the keys from the input dictionary in a grid format
     """
+    import pandas as pd
 
     # Take the trans type dictionary, rip the keys out and build a slightly prettier format to view all the keys
     keys_list = ['{0}. {1}'.format(key_index, keys) for key_index, keys in enumerate(keys_list)]
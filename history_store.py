@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from generic_helper import normalize_trans_name
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class HistoryStore:
+  """
+      An append-only store of every categorized transaction, kept in a local SQLite database
+
+      Each processed statement is stored as its own partition, keyed by the statement file name. Reprocessing a
+      statement replaces its partition, so a run only ever writes the statements it processed, and reads can be
+      narrowed by date range, category or statement without loading the whole history.
+
+      Alongside the transactions, every stored row's fingerprint, a hash of its date, normalized name, debit, credit
+      and running total, is indexed by statement. Rows a new statement shares with statements already stored (bank
+      exports often cover overlapping dates) can then be found in one query and dropped before they're counted twice.
+  """
+  COLUMNS = ["Date", "TransName", "Debit", "Credit", "CurTot", "TransType"]
+  # The columns a transaction's fingerprint is taken over
+  FINGERPRINT_COLUMNS = ["Date", "TransName", "Debit", "Credit", "CurTot"]
+  # The schema version, stored as the database's user_version. Databases from before version 1 have no fingerprints,
+  # and those from version 1 have fingerprints hashed by pandas, which can change between pandas versions
+  SCHEMA_VERSION = 2
+
+  def __init__(self, history_db_file):
+    logger.debug("Initializing HistoryStore")
+    self.history_db_file = history_db_file
+    self._connection = None
+
+
+  def __getstate__(self):
+    # SQLite connections can't be shared with worker processes, each process opens its own on first use
+    state = self.__dict__.copy()
+    state["_connection"] = None
+    return state
+
+
+  def connection(self):
+    """
+        A function to get the database connection, creating the database on first use
+
+        Returns:
+        connection {sqlite3.Connection}
+    """
+    if self._connection is None:
+      os.makedirs(os.path.dirname(self.history_db_file), exist_ok=True)
+      self._connection = sqlite3.connect(self.history_db_file)
+      self._connection.create_function("normalize_trans_name", 1, normalize_trans_name, deterministic=True)
+      with self._connection:
+        self._connection.execute(
+          "CREATE TABLE IF NOT EXISTS transactions ("
+          "Source TEXT NOT NULL, Date TEXT, TransName TEXT, Debit REAL, Credit REAL, CurTot REAL, TransType TEXT)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS transactions_source ON transactions (Source)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS transactions_date ON transactions (Date)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS transactions_trans_type ON transactions (TransType, Date)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS fingerprints (Source TEXT NOT NULL, Fingerprint INTEGER NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_fingerprint ON fingerprints (Fingerprint, Source)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_source ON fingerprints (Source)")
+      if self._connection.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+        self._index_fingerprints()
+    return self._connection
+
+
+  def _index_fingerprints(self, chunksize=50000):
+    # Fingerprint the transactions stored before the current fingerprints were kept, once
+    logger.info("Indexing the fingerprints of the stored transactions")
+    with self._connection:
+      self._connection.execute("DELETE FROM fingerprints")
+      for stored_df in pd.read_sql_query("SELECT Source, " + ", ".join(self.FINGERPRINT_COLUMNS) + " FROM transactions", self._connection, chunksize=chunksize):
+        self._connection.executemany(
+          "INSERT INTO fingerprints (Source, Fingerprint) VALUES (?, ?)", zip(stored_df["Source"], self.fingerprints(stored_df).tolist())
+        )
+      self._connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+
+  @classmethod
+  def fingerprints(cls, transactions_df):
+    """
+        A function to fingerprint transactions, so the same transaction exported in two statements can be recognized
+
+        Args:
+        transactions_df: {pd.DataFrame}    The transactions, with Date as datetimes or ISO (YYYY-MM-DD) dates
+
+        Returns:
+        fingerprints {np.ndarray}          A 64 bit blake2b digest of each transaction's date, normalized name, and amounts in
+                                           cents, so fingerprints stored by earlier runs stay comparable
+    """
+    if pd.api.types.is_datetime64_any_dtype(transactions_df["Date"]):
+      dates = transactions_df["Date"].dt.strftime("%Y-%m-%d").fillna("")
+    else:
+      dates = transactions_df["Date"].fillna("").astype(str).str[:10]
+
+    # Each distinct name is normalized once, then indexed back out by code
+    trans_names = transactions_df["TransName"].astype("category")
+    normalized_names = [normalize_trans_name(trans_name) or "" for trans_name in trans_names.cat.categories]
+    normalized_names = np.array(normalized_names + [""], dtype=object)[trans_names.cat.codes.to_numpy()]
+
+    fingerprint_fields = [dates.tolist(), normalized_names.tolist()]
+    for amount_column in ["Debit", "Credit", "CurTot"]:
+      amount_cents = (pd.to_numeric(transactions_df[amount_column], errors="coerce").to_numpy(dtype=float) * 100).round()
+      fingerprint_fields.append(np.where(np.isnan(amount_cents), "", np.nan_to_num(amount_cents).astype(np.int64).astype(str)).tolist())
+
+    # SQLite integers are signed
+    return np.fromiter((
+      int.from_bytes(hashlib.blake2b("\x1f".join(fields).encode(), digest_size=8).digest(), "big", signed=True)
+      for fields in zip(*fingerprint_fields)
+    ), dtype=np.int64, count=len(fingerprint_fields[0]))
+
+
+  def stored_counts(self, fingerprints, exclude_source=None):
+    """
+        A function to count how many times each fingerprint is already stored
+
+        Args:
+        fingerprints: {np.ndarray}    The fingerprints to look up, as returned by fingerprints
+        exclude_source: {str}         A statement file name whose own partition isn't counted, ex. the statement being processed again
+
+        Returns:
+        stored_counts {dict}          Key:Value sets for each stored fingerprint:number of stored transactions with it
+    """
+    if len(fingerprints) == 0:
+      return {}
+
+    connection = self.connection()
+    with connection:
+      connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_fingerprints (Fingerprint INTEGER PRIMARY KEY)")
+      connection.execute("DELETE FROM lookup_fingerprints")
+      connection.executemany("INSERT OR IGNORE INTO lookup_fingerprints (Fingerprint) VALUES (?)", ((fingerprint,) for fingerprint in np.unique(fingerprints).tolist()))
+      stored_counts = dict(connection.execute(
+        "SELECT fingerprints.Fingerprint, COUNT(*) FROM fingerprints JOIN lookup_fingerprints USING (Fingerprint) "
+        "WHERE fingerprints.Source IS NOT ? GROUP BY fingerprints.Fingerprint",
+        (exclude_source,)
+      ))
+
+    return stored_counts
+
+
+  def append_partition(self, source, categorized_statement_df, replace=True):
+    """
+        A function to store a categorized statement as a partition, replacing any earlier version of it
+
+        Args:
+        source: {str}                                The partition key, the statement file name
+        categorized_statement_df: {pd.DataFrame}    The categorized statement, with Date holding ISO (YYYY-MM-DD) dates
+        replace: {bool}                              Replace the partition, False to add to it, ex. for the later chunks of a statement
+    """
+    logger.debug("Storing %d transactions for %s", len(categorized_statement_df), source)
+    partition_df = categorized_statement_df[self.COLUMNS].astype(object)
+    partition_df = partition_df.where(partition_df.notna(), None)
+    fingerprints = self.fingerprints(categorized_statement_df) if not categorized_statement_df.empty else np.array([], dtype=np.int64)
+
+    connection = self.connection()
+    with connection:
+      if replace:
+        connection.execute("DELETE FROM transactions WHERE Source = ?", (source,))
+        connection.execute("DELETE FROM fingerprints WHERE Source = ?", (source,))
+      connection.executemany(
+        "INSERT INTO transactions (Source, Date, TransName, Debit, Credit, CurTot, TransType) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((source, *row) for row in partition_df.itertuples(index=False, name=None))
+      )
+      connection.executemany("INSERT INTO fingerprints (Source, Fingerprint) VALUES (?, ?)", ((source, fingerprint) for fingerprint in fingerprints.tolist()))
+
+
+  def read(self, start_date=None, end_date=None, trans_types=None, sources=None, chunksize=None):
+    """
+        A function to read back categorized transactions, narrowed by any of the given filters
+
+        Args:
+        start_date: {str}      The first date to include, as YYYY-MM-DD
+        end_date: {str}        The last date to include, as YYYY-MM-DD
+        trans_types: {list}    The categories to include
+        sources: {list}        The statement file names to include
+        chunksize: {int}       Read the transactions this many rows at a time
+
+        Returns:
+        transactions_df {pd.DataFrame}    The matching transactions, in date order. An iterator of dataframes if chunksize is given
+    """
+    conditions = []
+    params = []
+    if start_date is not None:
+      conditions.append("Date >= ?")
+      params.append(start_date)
+    if end_date is not None:
+      conditions.append("Date <= ?")
+      params.append(end_date)
+    if trans_types is not None:
+      conditions.append(f"TransType IN ({', '.join('?' * len(trans_types))})")
+      params.extend(trans_types)
+    if sources is not None:
+      conditions.append(f"Source IN ({', '.join('?' * len(sources))})")
+      params.extend(sources)
+
+    query = "SELECT Source, " + ", ".join(self.COLUMNS) + " FROM transactions"
+    if conditions:
+      query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY Date, rowid"
+
+    return pd.read_sql_query(query, self.connection(), params=params, chunksize=chunksize)
+
+
+  def reclassify(self, resolutions, from_trans_type="Unknown"):
+    """
+        A function to move stored transactions out of a category, matching them by normalized transaction name
+
+        Args:
+        resolutions: {dict}         Key:Value sets for each normalized transaction name:category to move it to
+        from_trans_type: {str}      The category the transactions are currently stored under
+
+        Returns:
+        sources {list}              The statement file names with a transaction that moved
+    """
+    if not resolutions:
+      return []
+
+    connection = self.connection()
+    with connection:
+      connection.execute("CREATE TEMP TABLE IF NOT EXISTS resolutions (TransName TEXT PRIMARY KEY, TransType TEXT)")
+      connection.execute("DELETE FROM resolutions")
+      connection.executemany("INSERT INTO resolutions (TransName, TransType) VALUES (?, ?)", resolutions.items())
+
+      moved_rows = "TransType = ? AND normalize_trans_name(TransName) IN (SELECT TransName FROM resolutions)"
+      sources = [source for (source,) in connection.execute(f"SELECT DISTINCT Source FROM transactions WHERE {moved_rows}", (from_trans_type,))]
+      connection.execute(
+        "UPDATE transactions SET TransType = "
+        "(SELECT TransType FROM resolutions WHERE resolutions.TransName = normalize_trans_name(transactions.TransName)) "
+        f"WHERE {moved_rows}",
+        (from_trans_type,)
+      )
+
+    logger.debug(f"Reclassified {from_trans_type} transactions in {len(sources)} statements")
+    return sources
+
+
+  def sources(self):
+    """
+        A function to list the statements stored so far
+
+        Returns:
+        sources {list}    The statement file names with a stored partition
+    """
+    return [source for (source,) in self.connection().execute("SELECT DISTINCT Source FROM transactions ORDER BY Source")]
+
+
+  def close(self):
+    if self._connection is not None:
+      self._connection.close()
+      self._connection = None
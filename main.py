@@ -1,137 +1,180 @@
-import configparser
+import argparse
 import logging.config
-import statement_processor  # Assuming statement_processor.py is in the same directory
 import generic_helper  # Assuming statement_processor.py is in the same directory
-import math
 import os
-import pandas as pd
 
-# Load the logging configuration
-logging.config.fileConfig('logging.conf')
+from transaction_cache import TransactionCache
+
+# statement_processor (and with it pandas) is imported in main, only once there are statements to process
+
+# Load the configuration file on first use
+config = generic_helper.LazyConfig('config.ini')
+
+# The logging configuration is loaded in main, once the logging profile to use is known
 logger = logging.getLogger("__main__")  # This will use the '__main__' settings in logging.conf
 
-def main():
+
+def parse_args():
+  """
+      A function to parse the command line arguments, falling back to config.ini for anything not given
+
+      Returns:
+      args {argparse.Namespace}     The parsed arguments
+  """
+  arg_parser = argparse.ArgumentParser(description="Categorize bank statements and build the monthly budget")
+  arg_parser.add_argument(
+    "--workers", type=int, default=config["PROCESSING"].getint("workers"),
+    help="Number of worker processes to read and categorize statements with, 0 for one per CPU (default: config.ini)"
+  )
+  arg_parser.add_argument(
+    "--chunk-rows", type=int, default=config["PROCESSING"].getint("chunk_rows"),
+    help="Stream each statement this many rows at a time to keep memory bounded on very large exports, 0 to read statements whole (default: config.ini)"
+  )
+  arg_parser.add_argument(
+    "--full", action="store_true", default=not config["PROCESSING"].getboolean("incremental"),
+    help="Reprocess every statement, not just the new or changed ones (default: config.ini)"
+  )
+  arg_parser.add_argument(
+    "--non-interactive", dest="interactive", action="store_false", default=config["PROCESSING"].getboolean("interactive"),
+    help="Don't ask about unknown transactions, leave them in the review queue file for a later run (default: config.ini)"
+  )
+  arg_parser.add_argument(
+    "--logging-config", default=config["LOGGING"]["logging_config"],
+    help="Logging profile to use, Ex. logging_production.conf to skip debug logging on large runs (default: config.ini)"
+  )
+  arg_parser.add_argument(
+    "--watch", action="store_true",
+    help="Keep running, processing statement files as they arrive in the statements folder. Unknown transactions are left in the review queue"
+  )
+  arg_parser.add_argument(
+    "--list-categories", action="store_true",
+    help="List the categories, in the order transactions are matched against them, and exit"
+  )
+  arg_parser.add_argument(
+    "--lookup", metavar="TRANS_NAME",
+    help="Print the category a transaction name would be put in from the transaction cache, and exit"
+  )
+  return arg_parser.parse_args()
+
+
+def run_quick_command(args):
+  """
+      A function to answer the commands that only need the transaction cache, without loading the statement processor
+
+      Args:
+      args: {argparse.Namespace}     The parsed arguments
+  """
+  transaction_cache = TransactionCache(
+    config["INPUT FILES"]["stored_transactions_file"],
+    config["INPUT FILES"]["stored_transactions_journal_file"],
+  )
+
+  if args.list_categories:
+    for trans_type, trans_names in transaction_cache.as_dict().items():
+      print(f"{trans_type} ({len(trans_names)} names)")
+
+  if args.lookup is not None:
+    compiled_cache_file = os.path.join(config["OUTPUT FILES"]["output_dir"], config["OUTPUT FILES"]["compiled_cache_file"])
+    trans_type = transaction_cache.build_matcher(compiled_cache_file).match(args.lookup)
+    print(f"{args.lookup}: {trans_type or 'no category, it would be queued for review'}")
+
+
+def review_unknown_transactions(processor, helper):
+  """
+      A function to ask for the category of each queued unknown transaction, once per merchant
+
+      Args:
+      processor: {StatementProcessor}    The processor holding the review queue
+      helper: {GenericHelper}            The helper used to lay out the categories
+  """
+  trans_list = processor.transaction_types_list
+  keys_frame = helper.transaction_grid_builder(trans_list)
+
+  for trans_name, entry in processor.review_queue.pending():
+    # Log transaction details
+    logger.info(
+      f"\nTransaction: {' / '.join(entry['TransNames'])}\nSeen: {entry['Count']} times\nDebit: {entry['Debit']}\nCredit: {entry['Credit']}\nDate: {entry['Date']}\nFile: {entry['File']}"
+    )
+
+    # Suggest the categories of the most similar stored names, the first is taken if nothing is entered
+    suggestions = [suggestion for suggestion in processor.similarity_index.suggest(trans_name) if suggestion[0] in trans_list]
+    suggestion_lines = "".join(
+      f"\n  {trans_list.index(trans_type)}: {trans_type} ({score:.0%} like {similar_name})" for trans_type, score, similar_name in suggestions
+    )
+    prompt = f"\nSuggested:{suggestion_lines}\nEnter Trans Type Number [{trans_list.index(suggestions[0][0])}]:" if suggestions else "\nEnter Trans Type Number:"
+
+    # Ask the user to categorize the transaction
+    try:
+      answer = input(f"\n{keys_frame}{prompt}").strip()
+      trans_type_num = trans_list.index(suggestions[0][0]) if not answer and suggestions else int(answer)
+
+      if 0 <= trans_type_num < len(trans_list):
+        logger.info(f"Creating new entry for {trans_name} in type {trans_list[trans_type_num]}")
+        processor.review_queue.resolve(trans_name, trans_list[trans_type_num])
+
+      else:
+        logger.warning("The number you entered doesn't correspond to a possible entry. Skipping")
+
+    except ValueError as ve:
+      logger.warning("You entered in invalid entry. Skipping")
+
+  # Apply all the answers at once
+  processor.resolve_queued_transactions()
+
+
+def main(args=None):
+
+  args = args or parse_args()
+
+  # Keep the loggers modules created on import, so anything not named in the profile still logs through root
+  logging.config.fileConfig(args.logging_config, disable_existing_loggers=False)
+
+  if args.list_categories or args.lookup is not None:
+    run_quick_command(args)
+    return
+
+  import statement_processor  # Assuming statement_processor.py is in the same directory
+  workers = args.workers or os.cpu_count()
 
   processor = statement_processor.StatementProcessor()
   helper = generic_helper.GenericHelper()
 
+  if args.watch:
+    from statement_watcher import StatementWatcher
+
+    StatementWatcher(
+      processor,
+      poll_seconds=config["PROCESSING"].getfloat("watch_poll_seconds"),
+      flush_seconds=config["PROCESSING"].getfloat("watch_flush_seconds"),
+      rolling_months=config["OUTPUT FILES"].getint("rolling_budget_months"),
+      chunk_rows=args.chunk_rows,
+      workers=workers,
+    ).run()
+    return
+
   try:
     #  Build the transaction cache
     logger.debug(f"Building caches, default data, and base data")
-    categorized_trans_names = processor.transaction_cache
-    trans_list = processor.transaction_types_list
-    trans_monthly_totals = processor.working_transaction_totals
 
-    keys_frame = helper.transaction_grid_builder(trans_list)
+    # Apply the categories filled in on the review queue since the last run
+    processor.resolve_queued_transactions()
 
     statements_path = processor.statements_path
     logger.debug(f"Statements path: {statements_path}")
 
     # Get list of files currently in Statements to Read path, and work through each one
-    statements_list = next(os.walk(statements_path), (None, None, []))[2]  # [] if no file
+    statements_list = sorted(next(os.walk(statements_path), (None, None, []))[2])  # [] if no file
     logger.info(f"Filenames: {statements_list}")
 
-    for statement_file in statements_list:
-      
-      logger.info(f"Processing: {statement_file}")
-      # Add a new column to the dataframe to hold the category of the transaction
-      working_statement_df = processor.read_statement_file(statement_file)
-      
-      # for index, transaction in enumerate(working_statement_df['TransName']):
-      for index, transaction in working_statement_df.iterrows():
-        trans_name = transaction["TransName"]
-        trans_month = helper.month_parser(transaction["Date"])
-        debit_value = transaction["Debit"]
-        credit_value = transaction["Credit"]
-        trans_date = transaction["Date"]
-
-        # Check if the transaction is known
-        for category, transactions in categorized_trans_names.items():
-          if any(trans_name in item for item in transactions):
-            found_trans_type = category
-            break
-          else:
-             found_trans_type = None
-
-        # If transaction is found, update the transaction totals
-        if found_trans_type:
-          logger.debug(f"Found transaction {trans_name} as type {found_trans_type}")
-
-        # If found_trans_type is None, we need to categorize the transaction
-        # Handle Credit Card Transfers as Ignore
-        elif "TFR-TO C/C" in trans_name:
-          found_trans_type = "Ignore"
-          logger.debug(f"Found transaction {trans_name} as type {found_trans_type}, it's a Credit Card Transfer")
-          
-        # Handle Costco as House
-        elif "CIBC MC" in trans_name:
-          found_trans_type = "House Purchases"
-          logger.debug(f"Found transaction {trans_name} as type {found_trans_type}, it's an Amazon Purchase")
-          categorized_trans_names[found_trans_type].append(trans_name)        
-          
-        # Handle Amazon as House for purchases / returns under $75
-        elif "AMZN" in transaction and (debit_value <= 75 or credit_value <= 75):
-            found_trans_type = "House Purchases"
-            logger.debug(f"Found transaction {trans_name} as type {found_trans_type}, it's an Amazon Purchase")
-            categorized_trans_names[found_trans_type].append(trans_name)        
-
-        # Handle EdwardJones Deposits as Raj type transactions
-        elif "EDWARD JONES" in trans_name:
-          if debit_value == 1750.00:
-            found_trans_type = "Raj Joint"
-            logger.debug(f"Found transaction {trans_name} as type {found_trans_type}, it's a Edward Jones Deposit")
-            categorized_trans_names[found_trans_type].append(trans_name)        
-          
-          elif debit_value == 1250.00:
-            found_trans_type = "Adam RRSP"
-            logger.debug(f"Found transaction {trans_name} as type {found_trans_type}, it's a Edward Jones Deposit")
-            categorized_trans_names[found_trans_type].append(trans_name)        
-
-        # Handle Groceries as Groceries
-        elif any(sub in transaction for sub in ['NATIONS', 'NOFRILLS', 'PACIFIC FRESH FOOD MARKET', 'FORTINOS']):
-          logger.debug(f"Found transaction {trans_name} as type House Purchases, it's an Amazon Purchase")
-          found_trans_type = "Groceries"  
-          categorized_trans_names[found_trans_type].append(trans_name)        
-
-        # Handle Unknown Transactions
-        else:
-          # Log transaction details
-          logger.info(
-            f"\nTransaction: {trans_name}\nDebit: {debit_value}\nCredit: {credit_value}\nDate: {trans_date}\nFile: {statement_file}"
-          )              
-          
-          # Ask the user to categorize the transaction
-          try:
-            trans_type_num = int(input(f"\n{keys_frame}\nEnter Trans Type Number:"))
-          
-            if trans_type_num < len(trans_list):
-              found_trans_type = trans_list[trans_type_num]
-              logger.info(f"Creating new entry for {trans_name} in type {found_trans_type} for {trans_month}")
-              categorized_trans_names[found_trans_type].append(trans_name)
-
-            else:
-              logger.warning("The number you entered doesn't correspond to a possible entry. Skipping")
-              found_trans_type = "Unknown"
-          
-          except ValueError as ve:
-              logger.warning("You entered in invalid entry. Skipping")
-              found_trans_type = "Unknown"
-
-        # Update the DF with the found transaction type
-        working_statement_df.at[index, "TransType"] = found_trans_type
-        
-        # If the transaction is a return / money entering the account, set the amount to the credit value
-        amount = -float(credit_value) if math.isnan(debit_value) else float(debit_value)
-        
-        # If the transaction is income, set the amount to the credit value as we'll sum the Incomes
-        amount = float(credit_value) if found_trans_type == "Income" and math.isnan(debit_value) else amount
-
-        # Update the transaction totals
-        trans_monthly_totals[found_trans_type].setdefault(trans_month, 0)
-        trans_monthly_totals[found_trans_type][trans_month] += amount
-
-      # Update the categorized transactions Df with the newly processed data at the end of each statement
-      processor.update_categorized_transactions_csv(working_statement_df)
+    # Statements processed in an earlier run and unchanged since only contribute their recorded totals
+    statements_list = processor.pending_statement_files(statements_list, reprocess_all=args.full)
+
+    # Categorize, tally and store each statement
+    processor.process_statement_files(statements_list, workers, args.chunk_rows)
+
+    # With everything else categorized, ask about each unknown merchant once, or leave them queued for a later run
+    if args.interactive:
+      review_unknown_transactions(processor, helper)
 
 
   except FileNotFoundError as fnf_error:
@@ -148,14 +191,7 @@ def main():
 
   finally:
     #  Clean up and write final files
-    # Update the transactions cache with the new transactions
-    processor.write_transaction_cache()
-
-    # Write the DF into a CSV to be used for future reference
-    processor.write_categorized_transactions_csv()
-
-    # Write the categorized transactions as the monthly breakdown for the actual budget
-    processor.write_monthly_transactions()
+    processor.write_outputs(config["OUTPUT FILES"].getint("rolling_budget_months"))
     
 
 if __name__ == "__main__":
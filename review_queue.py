@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import pandas as pd
+
+from generic_helper import normalize_trans_name
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class ReviewQueue:
+  """
+      The transactions no category could be found for, waiting to be categorized by hand
+
+      Entries are keyed by normalized transaction name, so a merchant is only ever asked about once however many
+      times, and in however many spellings, it shows up. The queue is kept in a JSON file between runs: a headless run
+      writes it out, someone fills in each entry's TransType, and the next run applies the answers in bulk.
+  """
+  def __init__(self, review_queue_file):
+    logger.debug("Initializing ReviewQueue")
+    self.review_queue_file = review_queue_file
+    self.entries = {}
+
+    if os.path.exists(self.review_queue_file):
+      with open(self.review_queue_file, 'r') as rqf:
+        self.entries = json.load(rqf)
+      logger.debug(f"Loaded {len(self.entries)} queued transactions from {self.review_queue_file}")
+
+
+  def load_answers(self):
+    """
+        A function to pick up the categories filled in on the queue file since it was loaded, ex. while the watcher is running
+
+        A file that can't be read, ex. left broken by a hand edit, is skipped and the entries in memory are kept as they are.
+
+        Returns:
+        answered_count {int}      The number of queued entries given a category
+    """
+    if not os.path.exists(self.review_queue_file):
+      return 0
+
+    try:
+      with open(self.review_queue_file, 'r') as rqf:
+        file_entries = json.load(rqf)
+    except ValueError as ve:
+      logger.warning(f"Couldn't read the answers in {self.review_queue_file}, keeping the queue as it was: {ve}")
+      return 0
+
+    answered_count = 0
+    for trans_name, file_entry in file_entries.items():
+      entry = self.entries.get(trans_name)
+      if entry is not None and not entry["TransType"] and file_entry.get("TransType"):
+        entry["TransType"] = file_entry["TransType"]
+        answered_count += 1
+
+    return answered_count
+
+
+  def add_unresolved(self, statement_file_name, unresolved_df):
+    """
+        A function to queue a statement's unresolved transactions, one entry per normalized name
+
+        Args:
+        statement_file_name: {str}          The statement file the transactions came from
+        unresolved_df: {pd.DataFrame}       The statement rows no category could be found for
+    """
+    for trans_name, trans_rows in unresolved_df.groupby(unresolved_df["TransName"].astype(object).map(normalize_trans_name), sort=False):
+      first_row = trans_rows.iloc[0]
+      entry = self.entries.setdefault(trans_name, {
+        "TransNames": [],
+        "TransType": None,
+        "Count": 0,
+        "Date": str(first_row["Date"])[:10],
+        "Debit": None if pd.isna(first_row["Debit"]) else float(first_row["Debit"]),
+        "Credit": None if pd.isna(first_row["Credit"]) else float(first_row["Credit"]),
+        "File": statement_file_name,
+      })
+      entry["Count"] += len(trans_rows)
+      for raw_trans_name in trans_rows["TransName"].unique():
+        if raw_trans_name not in entry["TransNames"]:
+          entry["TransNames"].append(raw_trans_name)
+
+
+  def pending(self):
+    """
+        A function to list the queued transactions still waiting for a category
+
+        Returns:
+        pending {list}       (normalized name, entry) pairs, most frequent first
+    """
+    pending_entries = [(trans_name, entry) for trans_name, entry in self.entries.items() if not entry["TransType"]]
+    return sorted(pending_entries, key=lambda pending_entry: -pending_entry[1]["Count"])
+
+
+  def resolve(self, trans_name, trans_type):
+    """
+        A function to set the category of a queued transaction
+
+        Args:
+        trans_name: {str}     The normalized transaction name the entry is keyed by
+        trans_type: {str}     The category to put the transaction in
+    """
+    self.entries[trans_name]["TransType"] = trans_type
+
+
+  def pop_resolved(self, trans_types_list):
+    """
+        A function to take every entry that has been given a valid category out of the queue
+
+        Args:
+        trans_types_list: {list}    The known categories, entries with anything else stay queued
+
+        Returns:
+        resolved {dict}             Key:Value sets for each normalized name:entry
+    """
+    resolved = {}
+    for trans_name, entry in list(self.entries.items()):
+      if not entry["TransType"]:
+        continue
+      if entry["TransType"] not in trans_types_list:
+        logger.warning(f"Queued transaction {trans_name} has unknown category {entry['TransType']}, leaving it queued")
+        continue
+      resolved[trans_name] = self.entries.pop(trans_name)
+
+    return resolved
+
+
+  def write(self):
+    """
+        A function to write the queue for the next run, or remove the file once the queue is empty
+
+        Categories filled in on the file since it was last read are picked up first, so they aren't written over.
+    """
+    self.load_answers()
+    if not self.entries:
+      if os.path.exists(self.review_queue_file):
+        os.remove(self.review_queue_file)
+      return
+
+    logger.info(f"Writing {len(self.entries)} transactions waiting for review to {self.review_queue_file}")
+    os.makedirs(os.path.dirname(self.review_queue_file), exist_ok=True)
+    temp_review_queue_file = self.review_queue_file + ".tmp"
+    with open(temp_review_queue_file, 'wt') as rqf:
+      rqf.write(json.dumps(self.entries, indent=4, sort_keys=True))
+    os.replace(temp_review_queue_file, self.review_queue_file)
@@ -0,0 +1,142 @@
+import json
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class RuleEngine:
+  """
+      Categorization rules for transactions the cache doesn't know, loaded from the rules file
+
+      Each rule is a JSON object with:
+      category {str}           The category to assign
+      contains / regex {str}   A substring, or a regular expression, searched for in the transaction name
+      priority {int}           Rules are tried in ascending priority, the first matching rule wins
+      remember {bool}          Whether to add matched transaction names to the transaction cache (default false)
+      ignore_case {bool}       Whether the name test ignores case (default false)
+      name {str}               Optional label used in the logs
+      Amount predicates (all optional, inclusive):
+      debit_min / debit_max / debit_equals      Tests on the Debit column
+      credit_min / credit_max / credit_equals   Tests on the Credit column
+      amount_min / amount_max / amount_equals   Tests on whichever of Debit / Credit is set
+  """
+  AMOUNT_PREDICATES = {
+    "debit_min", "debit_max", "debit_equals",
+    "credit_min", "credit_max", "credit_equals",
+    "amount_min", "amount_max", "amount_equals",
+  }
+  RULE_KEYS = {"name", "category", "contains", "regex", "priority", "remember", "ignore_case"} | AMOUNT_PREDICATES
+
+  def __init__(self, rules):
+    logger.debug("Initializing RuleEngine")
+    self.rules = sorted((self._compile_rule(rule) for rule in rules), key=lambda rule: rule["priority"])
+
+
+  @classmethod
+  def from_file(cls, rules_file):
+    """
+        A function to build the rule engine from the categorization rules file
+
+        Args:
+        rules_file: {str}    The path to the JSON rules file
+
+        Returns:
+        rule_engine {RuleEngine}
+    """
+    with open(rules_file, 'r') as rf:
+      rules = json.load(rf)
+
+    logger.debug(f"Loaded {len(rules)} categorization rules from {rules_file}")
+    return cls(rules)
+
+
+  def _compile_rule(self, rule):
+    unknown_keys = set(rule) - self.RULE_KEYS
+    if unknown_keys:
+      raise ValueError(f"Unknown keys {sorted(unknown_keys)} in categorization rule {rule}")
+
+    if "category" not in rule:
+      raise ValueError(f"Categorization rule {rule} has no category")
+
+    if ("contains" in rule) == ("regex" in rule):
+      raise ValueError(f"Categorization rule {rule} needs exactly one of contains / regex")
+
+    pattern = rule["regex"] if "regex" in rule else re.escape(rule["contains"])
+    flags = re.IGNORECASE if rule.get("ignore_case", False) else 0
+
+    return {
+      "name": rule.get("name", rule["category"]),
+      "category": rule["category"],
+      "priority": rule.get("priority", 0),
+      "remember": rule.get("remember", False),
+      "pattern": re.compile(pattern, flags),
+      "predicates": {key: float(value) for key, value in rule.items() if key in self.AMOUNT_PREDICATES},
+    }
+
+
+  def _amount_mask(self, values, predicates, prefix):
+    # NaN never satisfies a comparison, so a predicate on an empty column is false
+    mask = np.ones(len(values), dtype=bool)
+    if f"{prefix}_min" in predicates:
+      mask &= values >= predicates[f"{prefix}_min"]
+    if f"{prefix}_max" in predicates:
+      mask &= values <= predicates[f"{prefix}_max"]
+    if f"{prefix}_equals" in predicates:
+      mask &= np.isclose(values, predicates[f"{prefix}_equals"])
+    return mask
+
+
+  def categories(self):
+    """
+        A function to list the categories the rules put transactions in
+
+        Returns:
+        categories {list}     The categories, in rule order without repeats
+    """
+    return list(dict.fromkeys(rule["category"] for rule in self.rules))
+
+
+  def apply(self, statement_df):
+    """
+        A function to run every rule over a statement frame at once
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement rows to categorize
+
+        Returns:
+        rule_trans_types {pd.Series}    The category of the first matching rule per row, None where no rule matched
+        remember {pd.Series}            Whether the matching rule asks for the transaction name to be cached
+    """
+    if not self.rules or statement_df.empty:
+      return pd.Series(None, index=statement_df.index, dtype=object), pd.Series(False, index=statement_df.index)
+
+    trans_names = statement_df["TransName"]
+    debit_values = statement_df["Debit"].to_numpy(dtype=float)
+    credit_values = statement_df["Credit"].to_numpy(dtype=float)
+    amount_values = np.where(np.isnan(debit_values), credit_values, debit_values)
+
+    # Name tests are run once per distinct name, then broadcast back to the rows
+    unique_names = pd.Series(trans_names.dropna().unique())
+
+    rule_masks = []
+    for rule in self.rules:
+      matching_names = unique_names[unique_names.map(lambda name: rule["pattern"].search(name) is not None).astype(bool)]
+      rule_mask = (
+        trans_names.isin(matching_names).to_numpy()
+        & self._amount_mask(debit_values, rule["predicates"], "debit")
+        & self._amount_mask(credit_values, rule["predicates"], "credit")
+        & self._amount_mask(amount_values, rule["predicates"], "amount")
+      )
+      if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Rule %s matched %d transactions", rule["name"], rule_mask.sum())
+      rule_masks.append(rule_mask)
+
+    rule_trans_types = np.select(rule_masks, [rule["category"] for rule in self.rules], default=None)
+    remember = np.select(rule_masks, [rule["remember"] for rule in self.rules], default=False).astype(bool)
+
+    return pd.Series(rule_trans_types, index=statement_df.index, dtype=object), pd.Series(remember, index=statement_df.index)
@@ -0,0 +1,163 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import time
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class RunMetrics:
+  """
+      Wall time, row counts and categorization counts for a run, per stage and per statement file
+
+      Stages are timed with the stage context manager, and counts (cache hits, rule hits, similarity hits, unknowns) are added
+      with count. Metrics collected in a worker process are sent back and folded in with merge. The run report
+      is written as JSON next to the other outputs.
+  """
+  def __init__(self, run_report_file=None):
+    self.run_report_file = run_report_file
+    self.started = datetime.datetime.now().isoformat(timespec="seconds")
+    self.start_counter = time.perf_counter()
+    self.stages = {}
+    self.counts = {}
+    self.statements = {}
+
+
+  @staticmethod
+  def _add_stage(stages, stage_name, seconds, rows):
+    stage_metrics = stages.setdefault(stage_name, {"seconds": 0.0, "rows": 0, "calls": 0})
+    stage_metrics["seconds"] += seconds
+    stage_metrics["rows"] += rows
+    stage_metrics["calls"] += 1
+
+
+  def _statement(self, statement_file_name):
+    return self.statements.setdefault(statement_file_name, {"stages": {}, "counts": {}})
+
+
+  def record_stage(self, stage_name, seconds, rows=0, statement_file_name=None):
+    """
+        A function to add the wall time and rows of one pass through a stage
+
+        Args:
+        stage_name: {str}             The stage, Ex. read, categorize
+        seconds: {float}              The wall time taken
+        rows: {int}                   The number of transactions handled
+        statement_file_name: {str}    The statement file handled, if the stage works on one
+    """
+    self._add_stage(self.stages, stage_name, seconds, rows)
+    if statement_file_name is not None:
+      self._add_stage(self._statement(statement_file_name)["stages"], stage_name, seconds, rows)
+
+
+  @contextlib.contextmanager
+  def stage(self, stage_name, statement_file_name=None, rows=0):
+    """
+        A function to time a block as one pass through a stage
+
+        Args:
+        stage_name: {str}             The stage, Ex. read, categorize
+        statement_file_name: {str}    The statement file handled, if the stage works on one
+        rows: {int}                   The number of transactions handled, can be set on the yielded dict once known
+
+        Yields:
+        stage_metrics {dict}          Set stage_metrics["rows"] inside the block if the row count isn't known up front
+    """
+    stage_metrics = {"rows": rows}
+    stage_start = time.perf_counter()
+    try:
+      yield stage_metrics
+    finally:
+      self.record_stage(stage_name, time.perf_counter() - stage_start, stage_metrics["rows"], statement_file_name)
+
+
+  def count(self, counter_name, value=1, statement_file_name=None):
+    """
+        A function to add to a counter, Ex. cache_hits
+
+        Args:
+        counter_name: {str}           The counter
+        value: {int}                  The amount to add
+        statement_file_name: {str}    The statement file the count belongs to, if any
+    """
+    self.counts[counter_name] = self.counts.get(counter_name, 0) + value
+    if statement_file_name is not None:
+      statement_counts = self._statement(statement_file_name)["counts"]
+      statement_counts[counter_name] = statement_counts.get(counter_name, 0) + value
+
+
+  def merge(self, other, include_counts=True):
+    """
+        A function to fold in the metrics collected by another RunMetrics, Ex. one from a worker process
+
+        Args:
+        other: {RunMetrics}        The metrics to add to these
+        include_counts: {bool}     Add the other's counters too, not just its stage timings
+    """
+    self._merge(self.stages, self.counts, other.stages, other.counts if include_counts else {})
+    for statement_file_name, statement_metrics in other.statements.items():
+      merged_statement = self._statement(statement_file_name)
+      self._merge(
+        merged_statement["stages"], merged_statement["counts"], statement_metrics["stages"], statement_metrics["counts"] if include_counts else {}
+      )
+
+
+  @staticmethod
+  def _merge(stages, counts, other_stages, other_counts):
+    for stage_name, stage_metrics in other_stages.items():
+      merged_metrics = stages.setdefault(stage_name, {"seconds": 0.0, "rows": 0, "calls": 0})
+      for key, value in stage_metrics.items():
+        merged_metrics[key] += value
+    for counter_name, value in other_counts.items():
+      counts[counter_name] = counts.get(counter_name, 0) + value
+
+
+  @staticmethod
+  def _summarize(stages, counts):
+    summary = {"stages": {}, "counts": dict(counts)}
+    for stage_name, stage_metrics in stages.items():
+      summary["stages"][stage_name] = dict(
+        stage_metrics, rows_per_second=stage_metrics["rows"] / stage_metrics["seconds"] if stage_metrics["seconds"] else None
+      )
+
+    # Rates are over the transactions categorized, each one is a cache hit, a rule hit, a similarity hit or unknown
+    rates = [("cache_hit_rate", "cache_hits"), ("rule_hit_rate", "rule_hits"), ("similarity_hit_rate", "similarity_hits"), ("unknown_rate", "unknowns")]
+    categorized_rows = sum(counts.get(counter_name, 0) for _, counter_name in rates)
+    for rate_name, counter_name in rates:
+      summary[rate_name] = counts.get(counter_name, 0) / categorized_rows if categorized_rows else None
+
+    return summary
+
+
+  def report(self):
+    """
+        A function to build the run report
+
+        Returns:
+        report {dict}     The run's totals per stage and per statement file, with rows/sec and hit rates worked out
+    """
+    report = {"started": self.started, "seconds": time.perf_counter() - self.start_counter}
+    report.update(self._summarize(self.stages, self.counts))
+    report["statements"] = {
+      statement_file_name: self._summarize(statement_metrics["stages"], statement_metrics["counts"])
+      for statement_file_name, statement_metrics in self.statements.items()
+    }
+    return report
+
+
+  def write(self):
+    """
+        A function to write the run report, replacing any earlier one in a single step
+    """
+    if self.run_report_file is None:
+      return
+
+    logger.debug("Writing run report to %s", self.run_report_file)
+    os.makedirs(os.path.dirname(self.run_report_file), exist_ok=True)
+    temp_run_report_file = self.run_report_file + ".tmp"
+    with open(temp_run_report_file, 'wt') as rrf:
+      rrf.write(json.dumps(self.report(), indent=4, sort_keys=True))
+    os.replace(temp_run_report_file, self.run_report_file)
@@ -0,0 +1,151 @@
+import collections
+import logging
+import re
+
+from generic_helper import normalize_trans_name
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+# Categories never suggested, they're what a transaction is counted as when it has no real category
+UNSUGGESTED_CATEGORIES = ["Unknown"]
+
+# The lowest score worth suggesting, below it names share little more than a common word
+MIN_SUGGESTION_SCORE = 0.3
+
+
+def similarity_key(trans_name):
+  """
+      A function to reduce a transaction name to the form compared for similarity, the normalized name without
+      digits or punctuation, so store numbers and reference codes don't tell merchants apart.
+      Ex. "PETSMART INC. 0919" is "PETSMART INC"
+
+      Args:
+      trans_name: {str}     The transaction name
+
+      Returns:
+      key {str}             The similarity key, None for a missing name
+  """
+  normalized_name = normalize_trans_name(trans_name)
+  if normalized_name is None:
+    return None
+  return " ".join(re.sub(r"[^A-Z ]+", " ", normalized_name).split()) or normalized_name
+
+
+class SimilarityIndex:
+  """
+      An index of the stored transaction names by character trigram, for suggesting categories for unknown names
+
+      Each stored name is reduced to its similarity key and broken into the trigrams of " KEY ". A query only visits the
+      stored keys sharing at least one of its trigrams, through the trigram postings, and scores each by the Jaccard
+      similarity of their trigram sets. A category scores as its best matching key, so a query costs the length of the
+      postings it touches rather than a scan of the whole cache.
+
+      Keys are kept once, under the first category given, following the cache's first-match-wins order.
+  """
+  def __init__(self, trans_stored_cache=None):
+    logger.debug("Initializing SimilarityIndex")
+
+    # Stored keys, their category and trigram count, indexed by key id
+    self._keys = []
+    self._categories = []
+    self._sizes = []
+    self._key_ids = {}
+    # Trigram postings {trigram: [key ids]}
+    self._postings = collections.defaultdict(list)
+    # Category names in first-match-wins order, and their rank in that order
+    self._category_rank = {}
+
+    if trans_stored_cache:
+      for category, trans_names in trans_stored_cache.items():
+        for trans_name in trans_names:
+          self.add(trans_name, category)
+
+
+  def __len__(self):
+    return len(self._keys)
+
+
+  @staticmethod
+  def _trigrams(key):
+    padded_key = f" {key} "
+    return {padded_key[index:index + 3] for index in range(len(padded_key) - 2)}
+
+
+  def add(self, trans_name, category):
+    """
+        A function to add a categorized transaction name to the index in place
+
+        Args:
+        trans_name: {str}     The transaction name
+        category: {str}       The category the transaction name belongs to
+    """
+    self._category_rank.setdefault(category, len(self._category_rank))
+    key = similarity_key(trans_name)
+    if key is None or key in self._key_ids or category in UNSUGGESTED_CATEGORIES:
+      return
+
+    key_id = len(self._keys)
+    trigrams = self._trigrams(key)
+    self._key_ids[key] = key_id
+    self._keys.append(key)
+    self._categories.append(category)
+    self._sizes.append(len(trigrams))
+    for trigram in trigrams:
+      self._postings[trigram].append(key_id)
+
+
+  def suggest(self, trans_name, limit=3, min_score=MIN_SUGGESTION_SCORE):
+    """
+        A function to rank the categories of the stored names most like a transaction name
+
+        Args:
+        trans_name: {str}     The transaction name to find categories for
+        limit: {int}          The number of categories to return
+        min_score: {float}    The lowest score to suggest a category at
+
+        Returns:
+        suggestions {list}    (category, score, stored key) tuples, best first. Score is from 0 to 1, 1 where the
+                              similarity keys are the same
+    """
+    key = similarity_key(trans_name)
+    if key is None:
+      return []
+
+    key_id = self._key_ids.get(key)
+    if key_id is not None:
+      return [(self._categories[key_id], 1.0, key)][:limit]
+
+    trigrams = self._trigrams(key)
+    shared_trigrams = collections.Counter()
+    for trigram in trigrams:
+      shared_trigrams.update(self._postings.get(trigram, ()))
+
+    best_keys = {}
+    for key_id, shared_count in shared_trigrams.items():
+      score = shared_count / (len(trigrams) + self._sizes[key_id] - shared_count)
+      if score < min_score:
+        continue
+      category = self._categories[key_id]
+      if category not in best_keys or score > best_keys[category][0]:
+        best_keys[category] = (score, key_id)
+
+    ranked = sorted(best_keys.items(), key=lambda best_key: (-best_key[1][0], self._category_rank[best_key[0]]))
+    return [(category, score, self._keys[key_id]) for category, (score, key_id) in ranked[:limit]]
+
+
+  def best_match(self, trans_name, threshold):
+    """
+        A function to find a category confident enough to assign a transaction name to without asking
+
+        Args:
+        trans_name: {str}      The transaction name
+        threshold: {float}     The lowest score to accept, from 0 to 1
+
+        Returns:
+        category {str}         The best suggested category, None if it scores under the threshold
+    """
+    suggestions = self.suggest(trans_name, limit=1, min_score=threshold)
+    if suggestions and suggestions[0][1] >= threshold:
+      return suggestions[0][0]
+    return None
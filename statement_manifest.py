@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class StatementManifest:
+  """
+      A persistent record of the statement files already processed, and the totals each one contributed
+
+      Each entry is keyed by the statement file name and holds the file's size, mtime and sha256 content hash.
+      Size and mtime are checked first, so an untouched file is recognized without reading it. If either differs,
+      the content hash decides, so a file that was only copied or touched is still skipped.
+  """
+  def __init__(self, manifest_file):
+    logger.debug("Initializing StatementManifest")
+    self.manifest_file = manifest_file
+    self.entries = {}
+
+    if os.path.exists(self.manifest_file):
+      with open(self.manifest_file, 'r') as mf:
+        self.entries = json.load(mf)
+      logger.debug(f"Loaded {len(self.entries)} processed statements from {self.manifest_file}")
+
+
+  @staticmethod
+  def file_hash(file_path):
+    """
+        A function to hash a file's content without loading it all at once
+
+        Args:
+        file_path: {str}    The path to the file
+
+        Returns:
+        file_hash {str}     The sha256 hex digest of the file
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+      for block in iter(lambda: fh.read(1 << 20), b""):
+        sha256.update(block)
+    return sha256.hexdigest()
+
+
+  def is_unchanged(self, statement_file_name, file_path):
+    """
+        A function to check if a statement file has already been processed as it is now
+
+        Args:
+        statement_file_name: {str}    The statement file name the entry is keyed by
+        file_path: {str}              The path to the statement file
+
+        Returns:
+        unchanged {bool}              True if the file was processed before and its content hasn't changed since
+    """
+    entry = self.entries.get(statement_file_name)
+    if entry is None:
+      return False
+
+    file_stat = os.stat(file_path)
+    if entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime_ns:
+      return True
+
+    if entry["size"] != file_stat.st_size or entry["sha256"] != self.file_hash(file_path):
+      return False
+
+    # Same content with a new mtime, remember the new mtime so the file isn't hashed again next run
+    entry["mtime"] = file_stat.st_mtime_ns
+    return True
+
+
+  def record(self, statement_file_name, file_path, statement_totals):
+    """
+        A function to record a statement file as processed
+
+        Args:
+        statement_file_name: {str}    The statement file name to key the entry by
+        file_path: {str}              The path to the statement file
+        statement_totals: {list}      The [TransType, Year, Month, Amount] totals the file contributed
+    """
+    file_stat = os.stat(file_path)
+    self.entries[statement_file_name] = {
+      "size": file_stat.st_size,
+      "mtime": file_stat.st_mtime_ns,
+      "sha256": self.file_hash(file_path),
+      "totals": statement_totals,
+    }
+
+
+  def update_totals(self, statement_file_name, statement_totals):
+    """
+        A function to replace the totals recorded for a processed statement file, ex. after some of its transactions are recategorized
+
+        Args:
+        statement_file_name: {str}    The statement file name
+        statement_totals: {list}      The [TransType, Year, Month, Amount] totals the file now contributes
+    """
+    if statement_file_name in self.entries:
+      self.entries[statement_file_name]["totals"] = statement_totals
+
+
+  def totals(self, statement_file_name):
+    """
+        A function to get the totals a processed statement file contributed
+
+        Args:
+        statement_file_name: {str}    The statement file name
+
+        Returns:
+        statement_totals {list}       The [TransType, Year, Month, Amount] totals the file contributed
+    """
+    return self.entries[statement_file_name]["totals"]
+
+
+  def write(self):
+    """
+        A function to write the manifest, replacing the previous one in a single step so a crash can't leave it half written
+    """
+    logger.debug(f"Writing manifest of {len(self.entries)} processed statements")
+    os.makedirs(os.path.dirname(self.manifest_file), exist_ok=True)
+    temp_manifest_file = self.manifest_file + ".tmp"
+    with open(temp_manifest_file, 'wt') as mf:
+      mf.write(json.dumps(self.entries, indent=4, sort_keys=True))
+    os.replace(temp_manifest_file, self.manifest_file)
@@ -1,21 +1,63 @@
-import configparser
-import csv
+import collections
 import datetime
-import json
 import logging
-import math
 import os
+import time
+import numpy as np
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor
 
+from generic_helper import GenericHelper, LazyConfig, normalize_trans_name
+from history_store import HistoryStore
+from review_queue import ReviewQueue
+from rule_engine import RuleEngine
+from run_metrics import RunMetrics
+from similarity_index import SimilarityIndex
+from statement_manifest import StatementManifest
+from statement_readers import STATEMENT_COLUMNS, StatementReader
+from transaction_cache import TransactionCache
+from transaction_totals import TransactionTotals
 
-# Initialize the configparser
-config = configparser.ConfigParser()
-config.read('config.ini')
+
+# Initialize the configparser, the configuration file is loaded on first use
+config = LazyConfig('config.ini')
 
 # Initialize the logger
 logger = logging.getLogger(__name__)  # This will use the 'statementProcessorLogger' settings in logging.conf
 
+# The numeric columns of a statement, read as floats
+AMOUNT_COLUMNS = ["Debit", "Credit", "CurTot"]
+
+# What categorize_and_aggregate hands back
+# statement_df - the categorized statement, unknown transactions counted as Unknown
+# totals - the statement's summed amounts in cents (int64), indexed by (TransType, Year, Month)
+# unresolved_df - the statement rows no category could be found for
+StatementResult = collections.namedtuple("StatementResult", ["statement_df", "totals", "unresolved_df"])
+
+# The read-only processor each worker process matches statements against, set once per worker by _init_worker
+_worker_processor = None
+
+
+def _init_worker(processor):
+  global _worker_processor
+  _worker_processor = processor
+
+
+def _match_statement_file(statement_file_name):
+  # The read metrics are sent back with the statement, to be merged into the parent's. The match is timed here but
+  # recorded by the parent, over the rows left once duplicates are dropped
+  _worker_processor.run_metrics = RunMetrics()
+  statement_df = _worker_processor.read_statement_file(statement_file_name)
+  match_start = time.perf_counter()
+  statement_df, remembered_df, matched_by = _worker_processor.match_transactions(statement_df)
+  return statement_df, remembered_df, matched_by, time.perf_counter() - match_start, _worker_processor.run_metrics
+
+
+def _concat_rows(dfs, **kwargs):
+  # Empty frames are left out, as pandas 2.1 warns on concatenating them. The first is kept if they're all empty, for its columns
+  return pd.concat([df for df in dfs if not df.empty] or dfs[:1], **kwargs)
+
 
 class StatementProcessor:
   def __init__(self):
@@ -25,26 +67,55 @@ class StatementProcessor:
     # INPUTS
     # statements_path - the path to the directory containing the statements to read
     # categorized_transaction_cache_file - the path to the file containing the historic stored transactions types
+    # categorized_transaction_journal_file - the path to the file journaling the transaction names stored since the cache file was last compacted
+    # categorization_rules_file - the path to the file containing the rules for transactions the cache doesn't know
     self.current_dir = os.getcwd()
     self.statements_path = os.path.join(self.current_dir, config["INPUT FILES"]["statements_to_read_dir"])
     self.categorized_transaction_cache_file = os.path.join(self.current_dir, config["INPUT FILES"]["stored_transactions_file"])
+    self.categorized_transaction_journal_file = os.path.join(self.current_dir, config["INPUT FILES"]["stored_transactions_journal_file"])
+    self.categorization_rules_file = os.path.join(self.current_dir, config["INPUT FILES"]["categorization_rules_file"])
+    # compiled_cache_file - the path to the binary snapshot of the matcher compiled from the transaction cache
+    self.compiled_cache_file = os.path.join(self.current_dir, config["OUTPUT FILES"]["output_dir"], config["OUTPUT FILES"]["compiled_cache_file"])
     
     # WORKING VARIABLES
-    self.transaction_cache, self.transaction_types_list, self.working_transaction_totals = self.build_transaction_cache()
+    self.transaction_cache, self.transaction_types_list = self.build_transaction_cache()
+    self.transaction_totals = TransactionTotals(self.transaction_types_list)
+    self.transaction_matcher = self.transaction_cache.build_matcher(self.compiled_cache_file)
+    self.rule_engine = RuleEngine.from_file(self.categorization_rules_file)
+    self.similarity_index = SimilarityIndex(self.transaction_cache.as_dict())
+    # auto_assign_similarity - the similarity to a stored name an unknown name is put in its category at, without asking. 0 to always ask
+    self.auto_assign_similarity = config["PROCESSING"].getfloat("auto_assign_similarity")
+    self.statement_reader = StatementReader()
+    self.helper = GenericHelper()
 
     # OUTPUTS
     # output_dir - the path to the directory to output the categorized transactions
-    # historic_transactions_db_csv - the path to the file to output all historic categorized transactions as csv, to be used for future database
+    # historic_transactions_db_csv - the path to the file to output the categorized transactions processed this run as csv
+    # history_db_file - the path to the database holding every categorized transaction, one partition per statement
+    # review_queue_file - the path to the file holding the transactions waiting to be categorized by hand
+    # run_report_file - the path to the file to output the run's timings, row counts and hit rates per stage and statement
     # calculated_budget_file - the path to the file to output the calculated monthly budget
+    # processed_manifest_file - the path to the file recording the statements already processed, and their totals
     self.output_dir = os.path.join(self.current_dir, config["OUTPUT FILES"]["output_dir"])
     self.historic_transactions_db_csv = os.path.join(self.output_dir, config["OUTPUT FILES"]["historic_transactions_db_csv"])
     self.calculated_budget_file = os.path.join(self.output_dir, config["OUTPUT FILES"]["calculated_budget_file"])
-    
-    self.categorized_transactions_df = pd.DataFrame(columns=['Date', 'TransName', 'Debit', 'Credit', 'CurTot', 'TransType'])
-
-    logger.debug(f"Current directory: {self.current_dir}")
-    logger.debug(f"Statements path: {self.statements_path}")
-    logger.debug(f"Stored transactions file: {self.categorized_transaction_cache_file}")
+    self.processed_manifest_file = os.path.join(self.output_dir, config["OUTPUT FILES"]["processed_manifest_file"])
+    self.statement_manifest = StatementManifest(self.processed_manifest_file)
+    self.history_db_file = os.path.join(self.output_dir, config["OUTPUT FILES"]["history_db_file"])
+    self.history_store = HistoryStore(self.history_db_file)
+    # deduplicate - drop transactions already stored from another statement, ex. where two exports' dates overlap
+    self.deduplicate = config["PROCESSING"].getboolean("deduplicate")
+    self.categorized_transactions_file = self.historic_transactions_db_csv.split(".")[0] + "_" + self.start_time + ".csv"
+    # Key:Value sets for each statement file name processed this run:whether its transactions have been written to a csv since
+    self.processed_statements = {}
+    self.review_queue_file = os.path.join(self.output_dir, config["OUTPUT FILES"]["review_queue_file"])
+    self.review_queue = ReviewQueue(self.review_queue_file)
+    self.run_report_file = os.path.join(self.output_dir, config["OUTPUT FILES"]["run_report_file"])
+    self.run_metrics = RunMetrics(self.run_report_file.split(".")[0] + "_" + self.start_time + ".json")
+
+    logger.debug("Current directory: %s", self.current_dir)
+    logger.debug("Statements path: %s", self.statements_path)
+    logger.debug("Stored transactions file: %s", self.categorized_transaction_cache_file)
 
 
   def build_transaction_cache(self):
@@ -52,26 +123,30 @@ class StatementProcessor:
         A function to pull the transaction metadata that's been stored
 
         Returns:
-        trans_stored_cache {dict}       Key:Value sets for each TransactionType:[All Transaction names that have previously been categorized into this TransType ]
-    """      
-    with open(self.categorized_transaction_cache_file, 'r') as tsf:
-      trans_stored_cache = json.load(tsf)  # Directly loads JSON data
+        trans_stored_cache {TransactionCache}     The stored transaction names, from the cache file plus its journal
+        trans_list {list}                         The TransactionTypes, in the order they are matched in
+    """
+    trans_stored_cache = TransactionCache(
+      self.categorized_transaction_cache_file, self.categorized_transaction_journal_file,
+      compact_after=config["PROCESSING"].getint("cache_compact_after")
+    )
 
-    trans_list = list(trans_stored_cache.keys())
-    trans_monthly_totals = {key: {} for key in trans_stored_cache.keys()}    
+    trans_list = list(trans_stored_cache.as_dict().keys())
 
-    return trans_stored_cache, trans_list, trans_monthly_totals
+    return trans_stored_cache, trans_list
 
 
   def write_transaction_cache(self):
     """
-        A function to write all the newly categorized transactions to the local cache
+        A function to save the newly categorized transactions to the local cache, journaling only what's new
 
-        Args:
-        transaction_updates_dict {dict}       Key:Value sets for each TransactionType:[All Transaction names that have previously been categorized into this TransType]
-    """    
-    with open(self.categorized_transaction_cache_file, 'wt') as tsf_final:
-        tsf_final.write(json.dumps(self.transaction_cache, indent=4, sort_keys=True))
+    """
+    names_added = bool(self.transaction_cache.pending)
+    compacted = self.transaction_cache.flush()
+
+    # The matcher already holds this run's names, so it still matches the cache unless compaction reordered the categories
+    if names_added and not compacted:
+      self.transaction_matcher.save(self.compiled_cache_file, self.transaction_cache.cache_key())
 
 
   # def process_statement(self):
@@ -81,79 +156,816 @@ class StatementProcessor:
   #   """    
   #   logger.debug("Processing statement")
 
-  # def update_historic_transactions(self, trans_type, trans_name):
-  #   """
-  #       A function to update the historic transactions with the new data
+  def update_transaction_cache(self, trans_type, trans_name):
+    """
+        A function to store a newly categorized transaction name, keeping the matcher and similarity index in step with the cache
 
-  #   """    
-  #   logger.debug("Updating historic transactions")
-  #   self.transaction_cache[trans_type].append(trans_name)
-    
-  def update_categorized_transactions_csv(self, categorized_statement_df):
+        Args:
+        trans_type: {str}    The category the transaction was put in
+        trans_name: {str}    The transaction name from the statement
     """
-        A function to update the existing categorized transactions with the ones just processed
+    logger.debug("Updating transaction cache with %s as %s", trans_name, trans_type)
+    if self.transaction_cache.add(trans_name, trans_type):
+      self.transaction_matcher.add(trans_name, trans_type)
+      self.similarity_index.add(trans_name, trans_type)
+
+  def update_categorized_transactions_csv(self, categorized_statement_df, statement_file_name, replace=True):
+    """
+        A function to store the transactions just processed, as the statement's partition in the history store
 
         Args:
         categorized_statement_df: {pd.DataFrame}    The categorized transactions dataframe
+        statement_file_name: {str}                   The statement file the transactions came from
+        replace: {bool}                              Replace the statement's partition, False to add to it, ex. for the later chunks of a statement
 
-    """    
-    logger.debug("Updating categorized transactions")
-    self.categorized_transactions_df = pd.concat([self.categorized_transactions_df, categorized_statement_df], ignore_index=True)
-    logger.debug(f"Updated categorized transactions: \n{self.categorized_transactions_df}")
+    """
+    logger.debug("Updating categorized transactions with %d transactions from %s", len(categorized_statement_df), statement_file_name)
+    with self.run_metrics.stage("store", statement_file_name, rows=len(categorized_statement_df)):
+      history_df = categorized_statement_df.assign(Date=self.helper.parse_dates(categorized_statement_df["Date"]).dt.strftime("%Y-%m-%d"))
+      self.history_store.append_partition(statement_file_name, history_df, replace=replace)
+    if replace:
+      self.processed_statements[statement_file_name] = False
+
+  def write_categorized_transactions_csv(self, chunksize=50000):
+    """
+        A function to output the transactions of the statements processed since the last output, as they now stand in the
+        history store, to a csv
+
+        The first output of the run goes to the run's csv. Later ones, ex. each batch the watcher writes out, go to a new
+        csv stamped with the time they're written, and are skipped when nothing new has been processed.
+
+        Args:
+        chunksize: {int}    The number of transactions to read from the history store at a time
 
-  def write_categorized_transactions_csv(self):
     """
-        A function to output the categorized transactions to a file
+    unwritten_statements = [statement_file_name for statement_file_name, written in self.processed_statements.items() if not written]
+    if any(self.processed_statements.values()):
+      if not unwritten_statements:
+        return
+      self.categorized_transactions_file = self.historic_transactions_db_csv.split(".")[0] + "_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".csv"
+
+    logger.debug("Outputting categorized transactions from %d statements", len(unwritten_statements))
+    with self.run_metrics.stage("output") as stage_metrics:
+      os.makedirs(self.output_dir, exist_ok=True)
+      pd.DataFrame(columns=HistoryStore.COLUMNS).to_csv(self.categorized_transactions_file, index=False)
+      self.processed_statements.update(dict.fromkeys(unwritten_statements, True))
+      if not unwritten_statements:
+        return
+
+      for transactions_df in self.history_store.read(sources=unwritten_statements, chunksize=chunksize):
+        transactions_df[HistoryStore.COLUMNS].to_csv(self.categorized_transactions_file, mode="a", index=False, header=False)
+        stage_metrics["rows"] += len(transactions_df)
+
+  def read_categorized_transactions(self, start_date=None, end_date=None, trans_types=None):
+    """
+        A function to read categorized transactions back from the history store
+
+        Args:
+        start_date: {str}      The first date to include, as YYYY-MM-DD
+        end_date: {str}        The last date to include, as YYYY-MM-DD
+        trans_types: {list}    The categories to include
+
+        Returns:
+        transactions_df {pd.DataFrame}    The matching transactions, in date order
+    """
+    return self.history_store.read(start_date=start_date, end_date=end_date, trans_types=trans_types)
 
-    """    
-    logger.debug("Outputting categorized transactions")
-    categorized_transactions_file = self.historic_transactions_db_csv.split(".")[0] + "_" + self.start_time + ".csv"
-    self.categorized_transactions_df.to_csv(categorized_transactions_file, index=False)
-    
 
   def read_statement_file(self, statement_file_name):
     """
         A function to read the statement file
 
     """    
-    logger.debug(f"Reading statement file: {statement_file_name}")
-    statement_df = pd.read_csv(os.path.join(self.statements_path, statement_file_name), names = ["Date", "TransName", "Debit", "Credit", "CurTot"])
-    logger.debug(f"Dataframe: \n{statement_df}")
+    logger.debug("Reading statement file: %s", statement_file_name)
+    return self.read_statement(os.path.join(self.statements_path, statement_file_name), statement_file_name)
+
+
+  def read_statement(self, statement_source, statement_file_name=None):
+    """
+        A function to read a statement, from a file or from memory, ready to be categorized
+
+        Args:
+        statement_source: {str / file-like / bytes / pd.DataFrame}    A path to, or file-like object or bytes holding, a
+                                                                      statement csv in any layout the statement reader
+                                                                      recognizes. Or a dataframe with the Date, TransName,
+                                                                      Debit, Credit, CurTot columns, by name or as its only
+                                                                      5 columns, which is left untouched
+        statement_file_name: {str}                                    The statement file the transactions came from, to record metrics against
+
+        Returns:
+        categorized_statement_df {pd.DataFrame}    The statement, with Date parsed and an empty TransType column
+    """
+    with self.run_metrics.stage("read", statement_file_name) as stage_metrics:
+      date_format = None
+      if isinstance(statement_source, pd.DataFrame):
+        if set(STATEMENT_COLUMNS).issubset(statement_source.columns):
+          statement_df = statement_source[STATEMENT_COLUMNS].copy()
+        elif len(statement_source.columns) == len(STATEMENT_COLUMNS):
+          statement_df = statement_source.set_axis(STATEMENT_COLUMNS, axis="columns")
+        else:
+          raise ValueError(f"A statement needs the columns {STATEMENT_COLUMNS}, got {list(statement_source.columns)}")
+      else:
+        statement_df, date_format = self.statement_reader.read(statement_source, statement_file_name)
+      stage_metrics["rows"] = len(statement_df)
+
+      statement_df = self.prepare_statement(statement_df, date_format)
+
+    return statement_df
+
+
+  def prepare_statement(self, statement_df, date_format=None, infer_date_format=True):
+    """
+        A function to get freshly read statement rows ready to be categorized, in place
+
+        The statement is given its typed layout here, and keeps it through categorization and output: Date is a
+        datetime column, TransName and TransType are categorical (each distinct merchant and category string is held
+        once), and AmountCents holds each transaction's signed amount as whole cents, so totals are summed exactly.
+        Debit, Credit and CurTot stay as the raw amounts the categorization rules test and the history stores.
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement rows, with the STATEMENT_COLUMNS
+        date_format: {str}              The layout of the Date column, inferred from the rows if not given
+        infer_date_format: {bool}       Infer the layout of the Date column when it isn't given, False to parse each date on its own
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement, with Date parsed, AmountCents added and an empty TransType column
+    """
+    # Parse the whole date column once, keeping the dates as a real datetime column
+    statement_df["Date"] = self.helper.parse_dates(statement_df["Date"], date_format, infer_date_format)
+    statement_df["TransName"] = statement_df["TransName"].astype("category")
+    for amount_column in AMOUNT_COLUMNS:
+      statement_df[amount_column] = pd.to_numeric(statement_df[amount_column], errors="coerce").astype(float)
+    statement_df["AmountCents"] = self.amount_cents(statement_df)
 
     # Add a new column to the dataframe to hold the category of the transaction
-    categorized_statement_df = statement_df.copy()
-    categorized_statement_df["TransType"] = None
+    statement_df["TransType"] = pd.Categorical.from_codes(np.full(len(statement_df), -1), categories=self.trans_type_categories())
+
+    return statement_df
+
+
+  def trans_type_categories(self):
+    """
+        A function to list every category a transaction can be put in, for the categorical TransType column
+
+        Returns:
+        trans_types {list}     The cached categories, then those only set by categorization rules, then Unknown
+    """
+    return list(dict.fromkeys(self.transaction_types_list + self.rule_engine.categories() + ["Unknown"]))
+
 
-    return categorized_statement_df
-  
-  def write_monthly_transactions(self):
+  def amount_cents(self, statement_df):
     """
-        A function to write the monthly transactions
+        A function to work out each transaction's amount as a single signed whole number of cents
+
+        Debits are positive, credits (returns / money entering the account) negative. A statement already given its
+        typed layout has them in its AmountCents column, otherwise they're worked out from Debit and Credit.
 
         Args:
-        monthly_trans_df: {dict}    Key:Value sets for each TransactionType:[{month_name: sum_of_transactions}]
+        statement_df: {pd.DataFrame}    The statement dataframe
 
-    """    
+        Returns:
+        amount_cents {pd.Series}        The signed amount of each transaction in cents, 0 where neither Debit or Credit is set
+    """
+    if "AmountCents" in statement_df.columns:
+      return statement_df["AmountCents"]
+
+    debit_cents = (pd.to_numeric(statement_df["Debit"], errors="coerce").astype(float) * 100).round()
+    credit_cents = (pd.to_numeric(statement_df["Credit"], errors="coerce").astype(float) * 100).round()
+    return debit_cents.where(debit_cents.notna(), -credit_cents).fillna(0).astype("int64")
+
+
+  def read_statement_chunks(self, statement_file_name, chunk_rows):
+    """
+        A function to read a statement file a fixed number of rows at a time, so only one chunk is ever held in memory
+
+        The statement's layout is sniffed once. Unless the layout fixes the date layout, it's inferred once from every
+        distinct date in the file, read ahead of the chunks from the Date column alone, and used for the whole file, so
+        each chunk's dates are read the same as reading the file whole. Where no layout fits every date, each is parsed
+        on its own in every chunk, as it would be reading the file whole.
+
+        Args:
+        statement_file_name: {str}    The statement file name
+        chunk_rows: {int}             The number of rows per chunk
+
+        Yields:
+        statement_df {pd.DataFrame}   Each chunk of the statement, with Date parsed and an empty TransType column
+    """
+    logger.debug("Reading statement file: %s, %d rows at a time", statement_file_name, chunk_rows)
+    statement_file_path = os.path.join(self.statements_path, statement_file_name)
+    date_format = None
+    date_format_inferred = False
+    statement_chunks = self.statement_reader.read_chunks(statement_file_path, chunk_rows, statement_file_name)
+    while True:
+      with self.run_metrics.stage("read", statement_file_name) as stage_metrics:
+        statement_df, layout_date_format = next(statement_chunks, (None, None))
+        if statement_df is None:
+          return
+        stage_metrics["rows"] = len(statement_df)
+
+        if not date_format_inferred:
+          date_format = layout_date_format or self.helper.infer_date_format(self.statement_reader.read_distinct_dates(statement_file_path, chunk_rows, statement_file_name))
+          date_format_inferred = True
+        statement_df = self.prepare_statement(statement_df, date_format, infer_date_format=False)
+
+      yield statement_df
+
+
+  def drop_stored_transactions(self, statement_df, statement_file_name, occurrences=None):
+    """
+        A function to drop the transactions another statement has already stored, so overlapping exports are only counted once
+
+        Transactions are matched by fingerprint, see HistoryStore.fingerprints. A fingerprint can rightly appear more
+        than once, ex. two identical purchases the same day before the running total was updated, so only as many
+        copies are dropped as are already stored, the rest are kept. The statement's own earlier partition is ignored,
+        as it's replaced when the statement is stored.
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement dataframe, as returned by read_statement_file
+        statement_file_name: {str}      The statement file the transactions came from
+        occurrences: {dict}             Key:Value sets for each stored fingerprint:copies seen in earlier chunks of the same statement, updated in place
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement without the transactions already stored
+    """
+    if not self.deduplicate or statement_df.empty:
+      return statement_df
+
+    with self.run_metrics.stage("deduplicate", statement_file_name, rows=len(statement_df)):
+      fingerprints = pd.Series(HistoryStore.fingerprints(statement_df), index=statement_df.index)
+      stored_counts = self.history_store.stored_counts(fingerprints.to_numpy(), exclude_source=statement_file_name)
+      if not stored_counts:
+        return statement_df
+
+      # Number each copy of a fingerprint in file order, carrying on from the copies in earlier chunks
+      occurrence = fingerprints.groupby(fingerprints, sort=False).cumcount()
+      if occurrences is not None:
+        occurrence += fingerprints.map(occurrences).fillna(0).astype("int64")
+        for fingerprint, copies in fingerprints[fingerprints.isin(list(stored_counts))].value_counts().items():
+          occurrences[fingerprint] = occurrences.get(fingerprint, 0) + copies
+
+      stored = occurrence < fingerprints.map(stored_counts).fillna(0)
+
+    if stored.any():
+      logger.info(f"Dropping {int(stored.sum())} transactions from {statement_file_name} already stored from another statement")
+      self.run_metrics.count("duplicates", int(stored.sum()), statement_file_name)
+      statement_df = statement_df[~stored.to_numpy()].copy()
+
+    return statement_df
+
+
+  def categorize_and_aggregate(self, statement_source, statement_file_name=None):
+    """
+        A function to categorize and total a statement in memory, for calling the processor from other code
+
+        Nothing is written and the running totals, history and review queue are left alone, so the same processor can be
+        called over and over. Names from remembered rules are still added to the in-memory cache, as in a run.
+        The totals are whole cents, divide them by 100 before showing them as dollars.
+
+        Args:
+        statement_source: {str / file-like / bytes / pd.DataFrame / iterable}    A statement, in any form read_statement
+                                                                                 takes, or an iterable of such batches
+        statement_file_name: {str}                                               A name to record metrics against
+
+        Returns:
+        result {StatementResult}     The categorized statement, its totals in cents and its unresolved rows, over every batch
+    """
+    if isinstance(statement_source, (str, os.PathLike, bytes, bytearray, pd.DataFrame)) or hasattr(statement_source, "read"):
+      statement_batches = [statement_source]
+    else:
+      statement_batches = statement_source
+
+    categorized_dfs = []
+    partials = []
+    unresolved_dfs = []
+    for statement_batch in statement_batches:
+      statement_df = self.categorize_statement(self.read_statement(statement_batch, statement_file_name), statement_file_name)
+
+      unresolved = statement_df["TransType"].isna()
+      unresolved_dfs.append(statement_df[unresolved])
+      statement_df.loc[unresolved, "TransType"] = "Unknown"
+
+      partials.append(self.statement_totals(statement_df, statement_file_name))
+      categorized_dfs.append(statement_df)
+
+    if not categorized_dfs:
+      empty_df = pd.DataFrame(columns=HistoryStore.COLUMNS)
+      return StatementResult(empty_df, TransactionTotals.combine([]), empty_df.copy())
+
+    # Batches hold different merchants, so TransName is made categorical again over all of them
+    categorized_df = _concat_rows(categorized_dfs, ignore_index=True).astype({"TransName": "category"})
+    unresolved_df = _concat_rows(unresolved_dfs, ignore_index=True).astype({"TransName": "category"})
+    return StatementResult(categorized_df, TransactionTotals.combine(partials), unresolved_df)
+
+
+  def match_statement(self, statement_df, statement_file_name=None):
+    """
+        A function to categorize a whole statement against the transaction cache, then the categorization rules
+
+        Each distinct transaction name is looked up once, and the results are mapped back onto the TransType column.
+        Rows the cache doesn't know are run through the rule engine. If auto_assign_similarity is set, names still
+        unknown are put in the category of the most similar stored name scoring at least that, and remembered.
+        The cache itself is left untouched, so this is safe to run in worker processes against a read-only copy of the processor.
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement dataframe, as returned by read_statement_file
+        statement_file_name: {str}      The statement file the transactions came from, to record metrics against
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement with TransType set for every known transaction, left empty for the rest
+        remembered_df {pd.DataFrame}    The TransName / TransType pairs from rules marked remember, to be added to the cache
+    """
+    logger.debug("Categorizing statement")
+    with self.run_metrics.stage("categorize", statement_file_name, rows=len(statement_df)):
+      statement_df, remembered_df, matched_by = self.match_transactions(statement_df)
+
+    self.count_matches(statement_df, matched_by, statement_file_name)
+
+    return statement_df, remembered_df
+
+
+  def match_transactions(self, statement_df):
+    """
+        A function to categorize a statement as match_statement does, without recording any metrics
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement dataframe, as returned by read_statement_file
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement with TransType set for every known transaction, left empty for the rest
+        remembered_df {pd.DataFrame}    The TransName / TransType pairs from rules marked remember, to be added to the cache
+        matched_by {pd.Series}          How each transaction was categorized, cache, rule or similarity, None if it wasn't
+    """
+    # Each distinct name is one category of the TransName column, look each one up once and index the results by code
+    trans_names = statement_df["TransName"].astype("category")
+    found_trans_types = [self.transaction_matcher.match(trans_name) for trans_name in trans_names.cat.categories]
+    trans_types = np.array(found_trans_types + [None], dtype=object)[trans_names.cat.codes.to_numpy()]
+    matched_by = np.where(pd.isna(trans_types), None, "cache").astype(object)
+
+    unresolved = pd.Series(pd.isna(trans_types), index=statement_df.index)
+    rule_trans_types, remember = self.rule_engine.apply(statement_df[unresolved])
+    trans_types[unresolved.to_numpy()] = rule_trans_types.to_numpy()
+    remember = remember.reindex(statement_df.index, fill_value=False)
+    matched_by[unresolved.to_numpy() & pd.notna(trans_types)] = "rule"
+
+    if self.auto_assign_similarity > 0 and pd.isna(trans_types).any():
+      similar = self.assign_similar(statement_df["TransName"], trans_types)
+      remember |= similar
+      matched_by[similar] = "similarity"
+
+    known_trans_types = self.trans_type_categories()
+    new_trans_types = [trans_type for trans_type in pd.unique(trans_types[pd.notna(trans_types)]) if trans_type not in known_trans_types]
+    statement_df["TransType"] = pd.Categorical(trans_types, categories=known_trans_types + new_trans_types)
+
+    remembered_df = statement_df.loc[remember[remember].index, ["TransName", "TransType"]].drop_duplicates("TransName")
+
+    return statement_df, remembered_df, pd.Series(matched_by, index=statement_df.index, dtype=object)
+
+
+  def count_matches(self, statement_df, matched_by, statement_file_name=None):
+    """
+        A function to count how a statement's transactions were categorized
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement
+        matched_by: {pd.Series}         How each transaction was categorized, as returned by match_transactions
+        statement_file_name: {str}      The statement file the transactions came from
+    """
+    self.run_metrics.count("cache_lookups", int(statement_df["TransName"].nunique()), statement_file_name)
+    for counter_name, matched in [("cache_hits", "cache"), ("rule_hits", "rule"), ("similarity_hits", "similarity")]:
+      self.run_metrics.count(counter_name, int((matched_by == matched).sum()), statement_file_name)
+
+
+  def assign_similar(self, trans_names, trans_types):
+    """
+        A function to put each still unknown transaction in the category of the most similar stored name, where it's similar enough
+
+        Args:
+        trans_names: {pd.Series}      The statement's transaction names
+        trans_types: {np.ndarray}     The category found for each transaction, None where there isn't one yet. Updated in place
+
+        Returns:
+        similar {np.ndarray}          True for the transactions assigned a category here
+    """
+    unknown = pd.isna(trans_types)
+    unknown_names = trans_names[unknown].astype(object)
+    similar_trans_types = {}
+    for trans_name in unknown_names.dropna().unique():
+      trans_type = self.similarity_index.best_match(trans_name, self.auto_assign_similarity)
+      if trans_type is not None:
+        logger.info(f"Assigning {trans_name} to {trans_type}, the category of the most similar stored name")
+        similar_trans_types[trans_name] = trans_type
+
+    similar = np.zeros(len(trans_types), dtype=bool)
+    if similar_trans_types:
+      found_trans_types = unknown_names.map(similar_trans_types).to_numpy(dtype=object)
+      similar[unknown] = pd.notna(found_trans_types)
+      trans_types[similar] = found_trans_types[pd.notna(found_trans_types)]
+
+    return similar
+
+
+  def remember_transactions(self, remembered_df):
+    """
+        A function to add the names matched by remembered rules to the transaction cache
+
+        Args:
+        remembered_df: {pd.DataFrame}    TransName / TransType pairs, as returned by match_statement
+
+        Returns:
+        added_names {list}               The transaction names added to the cache
+    """
+    added_names = []
+    for trans_name, trans_type in remembered_df.itertuples(index=False):
+      if self.transaction_matcher.match(trans_name) is None:
+        self.update_transaction_cache(trans_type, trans_name)
+        added_names.append(trans_name)
+
+    return added_names
+
+
+  def categorize_statement(self, statement_df, statement_file_name=None):
+    """
+        A function to categorize a whole statement, adding names from remembered rules to the transaction cache
+
+        Args:
+        statement_df: {pd.DataFrame}    The statement dataframe, as returned by read_statement_file
+        statement_file_name: {str}      The statement file the transactions came from, to record metrics against
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement with TransType set for every known transaction, left empty for the rest
+    """
+    statement_df, remembered_df = self.match_statement(statement_df, statement_file_name)
+    self.remember_transactions(remembered_df)
+
+    return statement_df
+
+
+  def categorize_statements(self, statement_file_names, workers=1):
+    """
+        A function to read and categorize a list of statement files, optionally across worker processes
+
+        Workers match against a copy of the processor taken when the pool starts. Rows with a name added to the cache
+        since then are matched again here, so the results are the same as working in one process.
+
+        Args:
+        statement_file_names: {list}    The statement file names, in the order to process them
+        workers: {int}                  The number of worker processes, 1 to work in this process
+
+        Yields:
+        statement_file_name {str}       The statement file name, in the same order as statement_file_names
+        statement_df {pd.DataFrame}     The statement with TransType set for every known transaction, left empty for the rest
+    """
+    if workers <= 1 or len(statement_file_names) <= 1:
+      for statement_file_name in statement_file_names:
+        statement_df = self.drop_stored_transactions(self.read_statement_file(statement_file_name), statement_file_name)
+        yield statement_file_name, self.categorize_statement(statement_df, statement_file_name)
+      return
+
+    logger.info(f"Categorizing {len(statement_file_names)} statements across {workers} worker processes")
+    # Normalized names added to the cache since the pool started, which the workers didn't know
+    added_names = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+      # map hands results back in submission order, so statements are merged in file order
+      worker_results = executor.map(_match_statement_file, statement_file_names)
+      for statement_file_name, (statement_df, remembered_df, matched_by, match_seconds, worker_metrics) in zip(statement_file_names, worker_results):
+        self.run_metrics.merge(worker_metrics)
+
+        # Earlier statements in the run are only stored by now, so overlaps are dropped here rather than in the worker
+        statement_df = self.drop_stored_transactions(statement_df, statement_file_name)
+        matched_by = matched_by.loc[statement_df.index]
+
+        trans_names = statement_df["TransName"].astype("category")
+        rematch_names = [normalize_trans_name(trans_name) in added_names for trans_name in trans_names.cat.categories]
+        rematch = np.array(rematch_names + [False], dtype=bool)[trans_names.cat.codes.to_numpy()]
+
+        # The worker's match is counted over the rows kept, the rows matched again here are counted as they're matched
+        self.run_metrics.record_stage("categorize", match_seconds, int((~rematch).sum()), statement_file_name)
+        self.count_matches(statement_df[~rematch], matched_by[~rematch], statement_file_name)
+        if rematch.any():
+          statement_df, rematched_remembered_df = self.rematch_rows(statement_df, rematch, statement_file_name)
+          remembered_df = _concat_rows([remembered_df, rematched_remembered_df])
+
+        added_names.update(normalize_trans_name(trans_name) for trans_name in self.remember_transactions(remembered_df))
+        yield statement_file_name, statement_df
+
+
+  def rematch_rows(self, statement_df, rematch, statement_file_name=None):
+    """
+        A function to categorize some of a statement's rows again, Ex. those with names added to the cache since it was matched
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement
+        rematch: {np.ndarray}           True for the rows to match again
+        statement_file_name: {str}      The statement file the transactions came from, to record metrics against
+
+        Returns:
+        statement_df {pd.DataFrame}     The statement, with those rows' TransType replaced
+        remembered_df {pd.DataFrame}    The TransName / TransType pairs from rules marked remember, to be added to the cache
+    """
+    rematched_df, remembered_df = self.match_statement(statement_df[rematch].copy(), statement_file_name)
+
+    trans_types = statement_df["TransType"].astype(object)
+    trans_types[rematch] = rematched_df["TransType"].astype(object)
+    trans_type_categories = list(dict.fromkeys(list(statement_df["TransType"].cat.categories) + list(rematched_df["TransType"].cat.categories)))
+    statement_df["TransType"] = pd.Categorical(trans_types, categories=trans_type_categories)
+
+    return statement_df, remembered_df
+
+
+  def process_statement_files(self, statement_file_names, workers=1, chunk_rows=0):
+    """
+        A function to categorize, tally and store a list of statement files, recording each one as processed
+
+        Args:
+        statement_file_names: {list}    The statement file names, in the order to process them
+        workers: {int}                  The number of worker processes to read and categorize with
+        chunk_rows: {int}               Stream each statement this many rows at a time, in this process. 0 to read statements whole
+    """
+    if chunk_rows > 0:
+      for statement_file_name in statement_file_names:
+        self.process_statement_file_streamed(statement_file_name, chunk_rows)
+      return
+
+    # Read each statement and categorize every transaction known to the cache or matching a categorization rule in one pass
+    for statement_file_name, statement_df in self.categorize_statements(statement_file_names, workers):
+
+      logger.info(f"Processing: {statement_file_name}")
+
+      # Anything still uncategorized is counted as Unknown for now, and queued to be reviewed once
+      unresolved_count = self.queue_unresolved_transactions(statement_df, statement_file_name)
+      logger.info(f"Categorized {len(statement_df) - unresolved_count} of {len(statement_df)} transactions, {unresolved_count} queued for review")
+
+      # Sign the amounts and add them to the monthly totals for the whole statement at once
+      statement_totals = self.tally_statement(statement_df, statement_file_name)
+
+      # Store the newly processed data as the statement's partition of the transaction history
+      self.update_categorized_transactions_csv(statement_df, statement_file_name)
+
+      # Record the statement as processed, so it's skipped next run unless it changes
+      self.record_processed_statement(statement_file_name, statement_totals)
+
+
+  def process_statement_file_streamed(self, statement_file_name, chunk_rows):
+    """
+        A function to categorize, tally and store a statement file one chunk at a time, so memory stays bounded however large it is
+
+        Each chunk is categorized, queued, totalled and added to the statement's partition of the history before the
+        next one is read. The chunk totals are summed into the statement's totals once the whole file has been read.
+
+        Args:
+        statement_file_name: {str}    The statement file name
+        chunk_rows: {int}             The number of rows per chunk
+    """
+    logger.info(f"Processing: {statement_file_name}")
+    partials = []
+    row_count = 0
+    unresolved_count = 0
+    occurrences = {}
+    for chunk_index, statement_df in enumerate(self.read_statement_chunks(statement_file_name, chunk_rows)):
+      statement_df = self.drop_stored_transactions(statement_df, statement_file_name, occurrences)
+      statement_df = self.categorize_statement(statement_df, statement_file_name)
+      unresolved_count += self.queue_unresolved_transactions(statement_df, statement_file_name)
+      partials.append(self.statement_totals(statement_df, statement_file_name))
+      self.update_categorized_transactions_csv(statement_df, statement_file_name, replace=chunk_index == 0)
+      row_count += len(statement_df)
+
+    if not partials:
+      # An empty file still replaces anything stored for it before
+      self.update_categorized_transactions_csv(pd.DataFrame(columns=HistoryStore.COLUMNS), statement_file_name)
+
+    logger.info(f"Categorized {row_count - unresolved_count} of {row_count} transactions, {unresolved_count} queued for review")
+    statement_totals = TransactionTotals.combine(partials)
+    self.transaction_totals.update(statement_file_name, statement_totals)
+    self.record_processed_statement(statement_file_name, statement_totals)
+
+
+  def write_outputs(self, rolling_months=12):
+    """
+        A function to write out everything the run has changed
+
+        Args:
+        rolling_months: {int}    The number of months the rolling budget view covers
+    """
+    # Update the transactions cache with the new transactions
+    self.write_transaction_cache()
+
+    # Finish this run's CSV of categorized transactions
+    self.write_categorized_transactions_csv()
+
+    # Write the categorized transactions as the monthly breakdown for the actual budget, per year, across years and rolling
+    self.write_monthly_transactions(rolling_months)
+
+    # Write out the transactions still waiting for review
+    self.write_review_queue()
+
+    # Write the manifest of processed statements last, once everything it records has been written out
+    self.write_statement_manifest()
+
+    # Write the run's timings, row counts and hit rates per stage and statement
+    self.write_run_report()
+
+
+  def queue_unresolved_transactions(self, statement_df, statement_file_name):
+    """
+        A function to count a statement's uncategorized transactions as Unknown, and queue them for review
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement dataframe
+        statement_file_name: {str}      The statement file the transactions came from
+
+        Returns:
+        unresolved_count {int}          The number of transactions queued
+    """
+    unresolved = statement_df["TransType"].isna()
+    if unresolved.any():
+      self.review_queue.add_unresolved(statement_file_name, statement_df[unresolved])
+      statement_df.loc[unresolved, "TransType"] = "Unknown"
+
+    unresolved_count = int(unresolved.sum())
+    self.run_metrics.count("unknowns", unresolved_count, statement_file_name)
+    return unresolved_count
+
+
+  def resolve_queued_transactions(self):
+    """
+        A function to apply every category filled in on the review queue, in bulk
+
+        The transaction names are added to the cache, and transactions already stored as Unknown are moved to
+        their new category, updating the totals of the statements they came from
+
+        Returns:
+        resolved_count {int}     The number of queued transaction names resolved
+    """
+    resolved_entries = self.review_queue.pop_resolved(self.transaction_types_list)
+    if not resolved_entries:
+      return 0
+
+    logger.info(f"Applying {len(resolved_entries)} reviewed transaction categories")
+    self.run_metrics.count("reviewed", len(resolved_entries))
+    for entry in resolved_entries.values():
+      for trans_name in entry["TransNames"]:
+        if self.transaction_matcher.match(trans_name) is None:
+          self.update_transaction_cache(entry["TransType"], trans_name)
+
+    resolutions = {trans_name: entry["TransType"] for trans_name, entry in resolved_entries.items()}
+    for statement_file_name in self.history_store.reclassify(resolutions):
+      # Statements already written out this run are written out again with their new categories
+      if statement_file_name in self.processed_statements:
+        self.processed_statements[statement_file_name] = False
+      statement_totals = self.tally_statement(self.history_store.read(sources=[statement_file_name]), statement_file_name)
+      self.statement_manifest.update_totals(statement_file_name, TransactionTotals.to_records(statement_totals))
+
+    return len(resolved_entries)
+
+
+  def write_review_queue(self):
+    """
+        A function to write out the transactions still waiting for review
+
+    """
+    self.review_queue.write()
+
+
+  def signed_cents(self, statement_df):
+    """
+        A function to work out the amount, in cents, each categorized transaction adds to its category's total
+
+        Debits count as spending, credits (returns / money entering the account) count against it,
+        except for Income where the credit itself is what gets summed
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement dataframe
+
+        Returns:
+        amounts {pd.Series}             The signed amount of each transaction, in cents
+    """
+    amount_cents = self.amount_cents(statement_df)
+    income_credits = (statement_df["TransType"] == "Income").to_numpy() & (amount_cents < 0).to_numpy()
+
+    return amount_cents.mask(income_credits, -amount_cents)
+
+
+  def tally_statement(self, statement_df, statement_file_name):
+    """
+        A function to add a categorized statement to the running totals
+
+        The statement is reduced to its own (category, year, month) totals, which are added to the running totals
+        and returned so they can be recorded with the statement
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement dataframe
+        statement_file_name: {str}      The statement file the transactions came from
+
+        Returns:
+        statement_totals {pd.Series}    The statement's summed amounts, indexed by (TransType, Year, Month)
+    """
+    logger.debug("Tallying statement")
+    statement_totals = self.statement_totals(statement_df, statement_file_name)
+    self.transaction_totals.update(statement_file_name, statement_totals)
+
+    return statement_totals
+
+
+  def statement_totals(self, statement_df, statement_file_name=None):
+    """
+        A function to reduce a categorized statement to its own (category, year, month) totals, without adding them to the running totals
+
+        Args:
+        statement_df: {pd.DataFrame}    The categorized statement dataframe
+        statement_file_name: {str}      The statement file the transactions came from, to record metrics against
+
+        Returns:
+        statement_totals {pd.Series}    The statement's summed amounts, indexed by (TransType, Year, Month)
+    """
+    with self.run_metrics.stage("aggregate", statement_file_name, rows=len(statement_df)):
+      trans_dates = self.helper.parse_dates(statement_df["Date"])
+      return TransactionTotals.reduce_statement(statement_df["TransType"], trans_dates, self.signed_cents(statement_df))
+
+
+  def pending_statement_files(self, statement_file_names, reprocess_all=False):
+    """
+        A function to find the statement files that still need processing
+
+        Statements already in the manifest and unchanged since are skipped, and the totals they contributed
+        last time are added to the running totals instead
+
+        Args:
+        statement_file_names: {list}    The statement file names found in the statements path
+        reprocess_all: {bool}           Process every statement, ignoring the manifest
+
+        Returns:
+        pending_file_names {list}       The statement file names to process, in the same order as given
+    """
+    if reprocess_all:
+      return list(statement_file_names)
+
+    pending_file_names = []
+    for statement_file_name in statement_file_names:
+      statement_file_path = os.path.join(self.statements_path, statement_file_name)
+      if self.statement_manifest.is_unchanged(statement_file_name, statement_file_path) and TransactionTotals.is_records(self.statement_manifest.totals(statement_file_name)):
+        logger.debug("Skipping unchanged statement: %s", statement_file_name)
+        # Statements already in the running totals, ex. when checked again by the watcher, are left as they are
+        if statement_file_name not in self.transaction_totals.partials:
+          self.transaction_totals.update(statement_file_name, TransactionTotals.from_records(self.statement_manifest.totals(statement_file_name)))
+      else:
+        # Statements recorded before totals were kept per year, in cents, are processed again
+        pending_file_names.append(statement_file_name)
+
+    logger.info(f"Skipping {len(statement_file_names) - len(pending_file_names)} unchanged statements")
+    self.run_metrics.count("skipped_statements", len(statement_file_names) - len(pending_file_names))
+    return pending_file_names
+
+
+  def record_processed_statement(self, statement_file_name, statement_totals):
+    """
+        A function to record a fully processed statement in the manifest
+
+        Args:
+        statement_file_name: {str}    The statement file name
+        statement_totals: {pd.Series}    The statement's totals, as returned by tally_statement
+    """
+    self.statement_manifest.record(
+      statement_file_name, os.path.join(self.statements_path, statement_file_name), TransactionTotals.to_records(statement_totals)
+    )
+
+
+  def write_statement_manifest(self):
+    """
+        A function to write the manifest of processed statements
+
+    """
+    self.statement_manifest.write()
+
+
+  def write_monthly_transactions(self, rolling_months=12):
+    """
+        A function to write the budget views of the running totals
+
+        One Category x Jan..Dec budget file is written per year, plus a multi-year view totalling each category per year
+        and a rolling view of the latest months
+
+        Args:
+        rolling_months: {int}    The number of months the rolling view covers
+
+    """
     logger.debug("Writing monthly transactions")
-    
-    # Define the months in the required order
-    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    with self.run_metrics.stage("output"):
+      os.makedirs(self.output_dir, exist_ok=True)
+      budget_file_base = self.calculated_budget_file.split(".")[0]
 
-    # Create a list of headers: categories + months
-    headers = ["Category"] + months
+      for year in self.transaction_totals.years():
+        self.transaction_totals.monthly_budget(year).to_csv(f"{budget_file_base}_{year}_{self.start_time}.csv")
 
-    monthly_transaction_filename = self.calculated_budget_file.split(".")[0] + "_" + self.start_time + ".csv"
+      self.transaction_totals.yearly_budget().to_csv(f"{budget_file_base}_yearly_{self.start_time}.csv")
+      self.transaction_totals.rolling_budget(rolling_months).to_csv(f"{budget_file_base}_rolling_{self.start_time}.csv")
 
-    # Create the csv_file file
-    with open(monthly_transaction_filename, mode='w', newline='') as file:
-      writer = csv.writer(file)  # Write to the open file object
 
-      # Write the header row
-      writer.writerow(headers)
+  def write_run_report(self):
+    """
+        A function to write the run report, the run's timings, row counts and hit rates per stage and statement
 
-      # Write the data
-      for category, expenses in self.working_transaction_totals.items():
-        # Create a row with the category name followed by the amount spent per month
-        row = [category] + [expenses.get(month, None) for month in months]
-        writer.writerow(row)
-   
\ No newline at end of file
+    """
+    run_report = self.run_metrics.report()
+    for stage_name, stage_metrics in run_report["stages"].items():
+      logger.info(f"{stage_name}: {stage_metrics['rows']} rows in {stage_metrics['seconds']:.3f}s")
+    self.run_metrics.write()
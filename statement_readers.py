@@ -0,0 +1,349 @@
+import csv
+import datetime
+import io
+import logging
+import os
+import re
+
+import pandas as pd
+
+from generic_helper import DATE_FORMATS
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+# The columns of a statement, in the order the bank exports them, every layout is read into these
+STATEMENT_COLUMNS = ["Date", "TransName", "Debit", "Credit", "CurTot"]
+
+# The header names each statement column goes by in different banks' exports, compared lower case with punctuation dropped.
+# Amount is a single signed column some banks use in place of Debit and Credit
+COLUMN_ALIASES = {
+  "Date": ["date", "transaction date", "trans date", "posted date", "posting date", "value date"],
+  "TransName": ["transname", "description", "transaction", "transaction description", "details", "name", "payee", "memo", "narrative", "merchant"],
+  "Debit": ["debit", "debits", "debit amount", "withdrawal", "withdrawals", "money out", "paid out"],
+  "Credit": ["credit", "credits", "credit amount", "deposit", "deposits", "money in", "paid in"],
+  "CurTot": ["curtot", "balance", "running balance", "current balance"],
+  "Amount": ["amount", "transaction amount"],
+}
+
+# The delimiters tried, in order, when sniffing a statement
+DELIMITERS = [",", ";", "\t", "|"]
+
+# The number of bytes read from the start of a statement to sniff its layout
+SNIFF_BYTES = 64 * 1024
+
+
+def fastest_engine():
+  """
+      A function to pick the fastest pandas csv engine this install can use
+
+      Returns:
+      engine {str}     pyarrow if a version pandas supports is installed, otherwise c
+  """
+  from pandas.compat._optional import import_optional_dependency
+
+  try:
+    import_optional_dependency("pyarrow")
+  except ImportError:
+    return "c"
+  return "pyarrow"
+
+
+def _normalize_header(header):
+  return " ".join(re.sub(r"[^a-z0-9]+", " ", str(header).lower()).split())
+
+
+def _is_date(value):
+  value = value.strip()
+  for date_format in DATE_FORMATS:
+    try:
+      datetime.datetime.strptime(value, date_format)
+      return True
+    except ValueError:
+      continue
+  return False
+
+
+def _is_amount(value):
+  value = value.strip()
+  if not value:
+    return True
+  try:
+    float(value)
+    return True
+  except ValueError:
+    return False
+
+
+class StatementLayout:
+  """
+      How one bank lays out its statement export, and how to map it to the Date, TransName, Debit, Credit, CurTot columns
+
+      columns maps each statement column to the column holding it in the file, a header name when the file has a header
+      row, otherwise a position. A layout with an Amount column in place of Debit and Credit is split by sign, negative
+      amounts are money out (Debit) unless amount_sign is -1. Debit and Credit are always read as positive amounts.
+  """
+  def __init__(self, name, columns, header=False, delimiter=",", amount_sign=1, date_format=None):
+    self.name = name
+    self.columns = dict(columns)
+    self.header = header
+    self.delimiter = delimiter
+    self.amount_sign = amount_sign
+    self.date_format = date_format
+
+
+  def __repr__(self):
+    return f"StatementLayout({self.name!r}, {self.columns!r}, header={self.header!r}, delimiter={self.delimiter!r})"
+
+
+  def read_csv_args(self, engine="c"):
+    """
+        A function to build the pandas read_csv arguments that read the mapped columns with explicit dtypes
+
+        Headerless columns are read by position. pyarrow renumbers positional usecols, so with it every column is read
+        and the mapped ones are picked out by to_statement.
+
+        Args:
+        engine: {str}     The csv engine the arguments are for
+
+        Returns:
+        read_csv_args {dict}
+    """
+    dtype = {source_column: str if statement_column in ["Date", "TransName"] else "float64" for statement_column, source_column in self.columns.items()}
+    usecols = list(self.columns.values())
+    if not self.header and engine == "pyarrow":
+      usecols = None
+    return {"sep": self.delimiter, "header": 0 if self.header else None, "usecols": usecols, "dtype": dtype}
+
+
+  def to_statement(self, read_df):
+    """
+        A function to map a dataframe read with read_csv_args to the statement columns
+
+        Args:
+        read_df: {pd.DataFrame}         The columns read from the file
+
+        Returns:
+        statement_df {pd.DataFrame}     The Date, TransName, Debit, Credit, CurTot columns
+    """
+    read_df = read_df.rename(columns={source_column: statement_column for statement_column, source_column in self.columns.items()})
+
+    if "Amount" in read_df.columns:
+      amounts = read_df["Amount"] * self.amount_sign
+      read_df = read_df.assign(Debit=(-amounts).where(amounts < 0), Credit=amounts.where(amounts >= 0))
+
+    statement_df = read_df.reindex(columns=STATEMENT_COLUMNS)
+    for amount_column in ["Debit", "Credit"]:
+      statement_df[amount_column] = statement_df[amount_column].astype("float64").abs()
+    return statement_df
+
+
+def sniff_header_layout(sample_rows, delimiter):
+  """
+      A function to recognize a statement with a header row, by the names of its columns
+
+      Args:
+      sample_rows: {list}     The first rows of the statement, split into fields
+      delimiter: {str}        The delimiter the rows were split on
+
+      Returns:
+      layout {StatementLayout}    None if the first row isn't a header naming at least a date and a description
+  """
+  columns = {}
+  for header in sample_rows[0]:
+    for statement_column, aliases in COLUMN_ALIASES.items():
+      if _normalize_header(header) in aliases and statement_column not in columns:
+        columns[statement_column] = header
+
+  if "Date" not in columns or "TransName" not in columns:
+    return None
+  if "Amount" in columns and ("Debit" in columns or "Credit" in columns):
+    del columns["Amount"]
+  return StatementLayout("header", columns, header=True, delimiter=delimiter)
+
+
+def sniff_headerless_layout(sample_rows, delimiter):
+  """
+      A function to recognize a headerless statement, a date then a description then amounts
+
+      Five columns are Date, TransName, Debit, Credit, CurTot, four are Date, TransName, Amount, CurTot and three are
+      Date, TransName, Amount. Five columns are always taken as the original bank export, as statements always were
+      before layouts were sniffed, the fewer columns only once every row has a date and amounts where they're expected.
+
+      Args:
+      sample_rows: {list}     The first rows of the statement, split into fields
+      delimiter: {str}        The delimiter the rows were split on
+
+      Returns:
+      layout {StatementLayout}    None if the rows don't follow one of those layouts
+  """
+  amount_columns = {5: ["Debit", "Credit", "CurTot"], 4: ["Amount", "CurTot"], 3: ["Amount"]}.get(len(sample_rows[0]))
+  if amount_columns is None:
+    return None
+  if len(sample_rows[0]) != 5 and not all(_is_date(row[0]) and all(_is_amount(value) for value in row[2:]) for row in sample_rows):
+    return None
+
+  return StatementLayout(f"headerless_{len(sample_rows[0])}", dict(zip(["Date", "TransName"] + amount_columns, range(len(sample_rows[0])))), delimiter=delimiter)
+
+
+class StatementReader:
+  """
+      Reads bank statements in any known layout, as Date, TransName, Debit, Credit, CurTot dataframes
+
+      A statement's layout is sniffed from its first bytes by each registered sniffer in turn, and the first layout found
+      is used to read the whole file with explicit dtypes and the fastest installed csv engine. The layout found for each
+      source is cached along with its first line, so a batch of statements is only sniffed once per file until the file's
+      layout changes. Other layouts can be added with register.
+  """
+  def __init__(self, engine=None):
+    logger.debug("Initializing StatementReader")
+    self.engine = engine or fastest_engine()
+    self.sniffers = [sniff_header_layout, sniff_headerless_layout]
+    self.layouts = {}
+
+
+  def register(self, sniffer):
+    """
+        A function to add a layout sniffer, tried before the ones already registered
+
+        Args:
+        sniffer: {callable}     Takes (sample_rows, delimiter) and returns a StatementLayout, or None if it doesn't recognize the rows
+    """
+    self.sniffers.insert(0, sniffer)
+    self.layouts = {}
+
+
+  def sniff(self, sample):
+    """
+        A function to find the layout of a statement from its first bytes
+
+        Args:
+        sample: {bytes}     The start of the statement
+
+        Returns:
+        layout {StatementLayout}
+    """
+    sample_text = sample.decode("utf-8-sig", errors="replace")
+    sample_lines = [line for line in sample_text.splitlines() if line.strip()]
+    if len(sample) >= SNIFF_BYTES and len(sample_lines) > 1:
+      # The last line can be cut short by the sample
+      sample_lines = sample_lines[:-1]
+    if not sample_lines:
+      return StatementLayout("headerless_5", dict(zip(STATEMENT_COLUMNS, range(len(STATEMENT_COLUMNS)))))
+
+    for delimiter in DELIMITERS:
+      sample_rows = list(csv.reader(sample_lines, delimiter=delimiter))
+      if len(sample_rows[0]) < 3 or any(len(row) != len(sample_rows[0]) for row in sample_rows):
+        continue
+      for sniffer in self.sniffers:
+        layout = sniffer(sample_rows, delimiter)
+        if layout is not None:
+          return layout
+
+    raise ValueError(f"Unrecognized statement layout, starting: {sample_lines[0][:200]!r}")
+
+
+  def layout(self, sample, source_key=None):
+    """
+        A function to get the layout of a statement, sniffing it only if its source hasn't been seen with this first line
+
+        Args:
+        sample: {bytes}         The start of the statement
+        source_key: {str}       The path or name of the statement, None to sniff it without caching
+
+        Returns:
+        layout {StatementLayout}
+    """
+    cache_key = (source_key, sample.split(b"\n", 1)[0])
+    if source_key is None or cache_key not in self.layouts:
+      layout = self.sniff(sample)
+      logger.debug("Read %s as %r", source_key, layout)
+      if source_key is None:
+        return layout
+      self.layouts[cache_key] = layout
+    return self.layouts[cache_key]
+
+
+  def read(self, statement_source, source_key=None):
+    """
+        A function to read a whole statement in whichever layout it's in
+
+        Args:
+        statement_source: {str / file-like / bytes}    A path to, or file-like object or bytes holding, a statement csv
+        source_key: {str}                               The name to cache the statement's layout under, the path by default
+
+        Returns:
+        statement_df {pd.DataFrame}     The Date, TransName, Debit, Credit, CurTot columns, with Date still as text
+        date_format {str}               The layout of the Date column if the statement layout fixes one, otherwise None
+    """
+    if isinstance(statement_source, (str, os.PathLike)):
+      with open(statement_source, 'rb') as sf:
+        sample = sf.read(SNIFF_BYTES)
+      source_key = source_key or os.fspath(statement_source)
+    else:
+      if hasattr(statement_source, "read"):
+        statement_source = statement_source.read()
+      if isinstance(statement_source, str):
+        statement_source = statement_source.encode()
+      sample = bytes(statement_source[:SNIFF_BYTES])
+      statement_source = io.BytesIO(statement_source)
+
+    layout = self.layout(sample, source_key)
+    if not sample.strip():
+      return pd.DataFrame({column: pd.Series(dtype=str if column in ["Date", "TransName"] else "float64") for column in STATEMENT_COLUMNS}), layout.date_format
+
+    read_df = pd.read_csv(statement_source, engine=self.engine, **layout.read_csv_args(self.engine))
+    return layout.to_statement(read_df), layout.date_format
+
+
+  def read_chunks(self, statement_file_path, chunk_rows, source_key=None):
+    """
+        A function to read a statement file a fixed number of rows at a time, in whichever layout it's in
+
+        pyarrow can't read in chunks, so chunks are always read with the c engine.
+
+        Args:
+        statement_file_path: {str}    The path to the statement file
+        chunk_rows: {int}             The number of rows per chunk
+        source_key: {str}             The name to cache the statement's layout under, the path by default
+
+        Yields:
+        statement_df {pd.DataFrame}     Each chunk's Date, TransName, Debit, Credit, CurTot columns, with Date still as text
+        date_format {str}               The layout of the Date column if the statement layout fixes one, otherwise None
+    """
+    with open(statement_file_path, 'rb') as sf:
+      sample = sf.read(SNIFF_BYTES)
+    layout = self.layout(sample, source_key or os.fspath(statement_file_path))
+    if not sample.strip():
+      return
+
+    with pd.read_csv(statement_file_path, engine="c", chunksize=chunk_rows, **layout.read_csv_args()) as statement_reader:
+      for read_df in statement_reader:
+        yield layout.to_statement(read_df), layout.date_format
+
+
+  def read_distinct_dates(self, statement_file_path, chunk_rows, source_key=None):
+    """
+        A function to collect the distinct date strings of a whole statement file, reading only its Date column a fixed
+        number of rows at a time
+
+        Args:
+        statement_file_path: {str}    The path to the statement file
+        chunk_rows: {int}             The number of rows per chunk
+        source_key: {str}             The name to cache the statement's layout under, the path by default
+
+        Returns:
+        date_strings {pd.Series}      The distinct date strings, stripped of surrounding spaces
+    """
+    with open(statement_file_path, 'rb') as sf:
+      sample = sf.read(SNIFF_BYTES)
+    layout = self.layout(sample, source_key or os.fspath(statement_file_path))
+    if not sample.strip():
+      return pd.Series(dtype=str)
+
+    date_layout = StatementLayout(layout.name, {"Date": layout.columns["Date"]}, header=layout.header, delimiter=layout.delimiter)
+    date_strings = set()
+    with pd.read_csv(statement_file_path, engine="c", chunksize=chunk_rows, **date_layout.read_csv_args()) as date_reader:
+      for read_df in date_reader:
+        date_strings.update(read_df.iloc[:, 0].dropna().astype(str).str.strip().unique())
+    return pd.Series(sorted(date_strings), dtype=str)
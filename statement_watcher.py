@@ -0,0 +1,141 @@
+import logging
+import os
+import time
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class StatementWatcher:
+  """
+      A long-running loop around a StatementProcessor, processing statement files as they land in the statements folder
+
+      The processor stays in memory between statements, so the cache, matcher, history store and running totals are
+      only built once. The folder is polled, and a new or changed file is processed once its size and mtime have held
+      steady for a whole poll, so files still being copied in are left alone. Several files settling in the same poll
+      are categorized across worker processes. Outputs are written in batches, at most once every flush_seconds, and
+      once more on the way out. Categories filled in on the review queue file are applied as they're found.
+  """
+  def __init__(self, processor, poll_seconds=10, flush_seconds=60, rolling_months=12, chunk_rows=0, workers=1):
+    logger.debug("Initializing StatementWatcher")
+    self.processor = processor
+    self.poll_seconds = poll_seconds
+    self.flush_seconds = flush_seconds
+    self.rolling_months = rolling_months
+    self.chunk_rows = chunk_rows
+    self.workers = workers
+
+    # Key:Value sets for each statement file name:(size, mtime) as of the last poll, None until the first poll
+    self.file_stats = None
+    # Key:Value sets for each statement file name:(size, mtime) when it was last handled, processed, skipped as
+    # unchanged or failed, so it's only looked at again once it changes
+    self.handled_stats = {}
+    self.dirty = False
+    self.last_flush = time.monotonic()
+
+
+  def settled_statement_files(self):
+    """
+        A function to list the statement files that are new or changed, and haven't changed since the last poll
+
+        Every file present on the first poll counts as settled, so statements already waiting are processed straight away.
+
+        Returns:
+        settled_file_names {list}    The statement file names, sorted
+    """
+    file_stats = {}
+    with os.scandir(self.processor.statements_path) as statement_entries:
+      for statement_entry in statement_entries:
+        if statement_entry.is_file():
+          entry_stat = statement_entry.stat()
+          file_stats[statement_entry.name] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+
+    previous_stats = self.file_stats if self.file_stats is not None else file_stats
+    self.file_stats = file_stats
+
+    return sorted(
+      statement_file_name for statement_file_name, file_stat in file_stats.items()
+      if previous_stats.get(statement_file_name) == file_stat and self.handled_stats.get(statement_file_name) != file_stat
+    )
+
+
+  def poll(self):
+    """
+        A function to apply any reviewed categories, then process every settled statement file not processed as it is now
+
+        Returns:
+        processed_count {int}    The number of statement files processed
+    """
+    self.processor.review_queue.load_answers()
+    if self.processor.resolve_queued_transactions():
+      self.dirty = True
+
+    settled_file_names = self.settled_statement_files()
+    if not settled_file_names:
+      return 0
+
+    pending_file_names = self.processor.pending_statement_files(settled_file_names)
+    processed_count = 0
+    if self.workers > 1 and len(pending_file_names) > 1:
+      try:
+        self.processor.process_statement_files(pending_file_names, workers=self.workers, chunk_rows=self.chunk_rows)
+        processed_count = len(pending_file_names)
+        pending_file_names = []
+      except Exception as e:
+        # Statements recorded before the failure are done, the rest are tried one at a time so only the bad one is held back
+        logger.warning(f"Couldn't process the batch across workers, processing its statements one at a time: {e}")
+        remaining_file_names = self.processor.pending_statement_files(pending_file_names)
+        processed_count = len(pending_file_names) - len(remaining_file_names)
+        pending_file_names = remaining_file_names
+
+    for statement_file_name in pending_file_names:
+      try:
+        self.processor.process_statement_files([statement_file_name], chunk_rows=self.chunk_rows)
+        processed_count += 1
+      except Exception as e:
+        logger.error(f"Couldn't process {statement_file_name}, it will be retried once it changes: {e}", exc_info=True)
+
+    for statement_file_name in settled_file_names:
+      self.handled_stats[statement_file_name] = self.file_stats[statement_file_name]
+
+    if processed_count:
+      self.dirty = True
+    return processed_count
+
+
+  def flush(self):
+    """
+        A function to write out the outputs, if anything has changed since they were last written
+    """
+    if self.dirty:
+      logger.info("Writing outputs")
+      self.processor.write_outputs(self.rolling_months)
+      self.dirty = False
+    self.last_flush = time.monotonic()
+
+
+  def run(self, max_polls=None):
+    """
+        A function to keep polling until interrupted, writing the outputs in batches
+
+        Args:
+        max_polls: {int}     Stop after this many polls, None to run until interrupted
+    """
+    logger.info(f"Watching {self.processor.statements_path} every {self.poll_seconds}s")
+    polls = 0
+    try:
+      while max_polls is None or polls < max_polls:
+        self.poll()
+        polls += 1
+
+        if time.monotonic() - self.last_flush >= self.flush_seconds:
+          self.flush()
+
+        if max_polls is None or polls < max_polls:
+          time.sleep(self.poll_seconds)
+
+    except KeyboardInterrupt:
+      logger.info("Saw a keyboard interrupt, stopping the watcher")
+
+    finally:
+      self.flush()
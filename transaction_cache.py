@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import os
+
+from generic_helper import normalize_trans_name
+from transaction_matcher import TransactionMatcher
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class TransactionCache:
+  """
+      The stored transaction names and their categories, persisted as a snapshot plus an append-only journal
+
+      The snapshot is the {category: [transaction names]} JSON file. Names categorized since the last compaction are
+      appended to the journal, one JSON line per (name, category), so saving only ever writes what is new and a crash
+      can lose at most the entries that hadn't been flushed. Once the journal grows past compact_after entries, it is
+      folded into a new snapshot, which replaces the old one in a single step.
+
+      Names are kept normalized (whitespace collapsed, upper case) and stored once, the first category given wins.
+  """
+  def __init__(self, snapshot_file, journal_file, compact_after=1000):
+    logger.debug("Initializing TransactionCache")
+    self.snapshot_file = snapshot_file
+    self.journal_file = journal_file
+    self.compact_after = compact_after
+
+    # Key:Value sets for each TransactionType:[normalized names], in first-match-wins order
+    self.categories = {}
+    # Key:Value sets for each normalized name:TransactionType
+    self.trans_types = {}
+    # (name, category) pairs added since the last flush
+    self.pending = []
+    self.journal_entries = 0
+    self.snapshot_stale = False
+
+    self.load()
+
+
+  def __len__(self):
+    return len(self.trans_types)
+
+
+  def load(self):
+    """
+        A function to load the snapshot, then replay the journal written since it was compacted
+    """
+    with open(self.snapshot_file, 'r') as tsf:
+      trans_stored_cache = json.load(tsf)
+
+    stored_names = 0
+    for trans_type, trans_names in trans_stored_cache.items():
+      self.categories.setdefault(trans_type, [])
+      for trans_name in trans_names:
+        stored_names += 1
+        self._insert(trans_name, trans_type)
+
+    # Duplicate or unnormalized names in the snapshot are cleaned up at the next compaction
+    self.snapshot_stale = stored_names != len(self.trans_types) or any(
+      trans_name != normalize_trans_name(trans_name) for trans_names in trans_stored_cache.values() for trans_name in trans_names
+    )
+
+    if os.path.exists(self.journal_file):
+      self._replay_journal()
+
+    logger.debug("Loaded %d transaction names, %d from the journal", len(self.trans_types), self.journal_entries)
+
+
+  def _replay_journal(self):
+    valid_length = 0
+    with open(self.journal_file, 'rb') as tjf:
+      for line in tjf:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          # Only the last entry can be partly written, by a crash during a flush
+          logger.warning(f"Dropping a partly written entry from the end of {self.journal_file}")
+          break
+        self.categories.setdefault(entry["TransType"], [])
+        self._insert(entry["TransName"], entry["TransType"])
+        self.journal_entries += 1
+        valid_length += len(line)
+
+    if valid_length != os.path.getsize(self.journal_file):
+      with open(self.journal_file, 'r+b') as tjf:
+        tjf.truncate(valid_length)
+
+
+  def _insert(self, trans_name, trans_type):
+    normalized_name = normalize_trans_name(trans_name)
+    if normalized_name is None or normalized_name in self.trans_types:
+      return False
+
+    self.trans_types[normalized_name] = trans_type
+    self.categories.setdefault(trans_type, []).append(normalized_name)
+    return True
+
+
+  def add(self, trans_name, trans_type):
+    """
+        A function to store a newly categorized transaction name, unless it's already stored
+
+        Args:
+        trans_name: {str}     The transaction name from the statement
+        trans_type: {str}     The category the transaction was put in
+
+        Returns:
+        added {bool}          True if the name is new to the cache
+    """
+    if not self._insert(trans_name, trans_type):
+      return False
+
+    self.pending.append((normalize_trans_name(trans_name), trans_type))
+    return True
+
+
+  def trans_type(self, trans_name):
+    """
+        A function to get the category a transaction name is stored under
+
+        Args:
+        trans_name: {str}     The transaction name
+
+        Returns:
+        trans_type {str}      The category, None if the name isn't stored
+    """
+    return self.trans_types.get(normalize_trans_name(trans_name))
+
+
+  def as_dict(self):
+    """
+        A function to get the cache in the snapshot layout
+
+        Returns:
+        trans_stored_cache {dict}     Key:Value sets for each TransactionType:[normalized names], in first-match-wins order
+    """
+    return self.categories
+
+
+  def cache_key(self):
+    """
+        A function to hash the cache as it's stored on disk, the snapshot followed by the journal
+
+        Returns:
+        cache_key {str}      The sha256 hex digest of the snapshot and journal
+    """
+    sha256 = hashlib.sha256()
+    for cache_file in [self.snapshot_file, self.journal_file]:
+      if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as cf:
+          sha256.update(cf.read())
+      sha256.update(b"\0")
+    return sha256.hexdigest()
+
+
+  def build_matcher(self, compiled_file=None):
+    """
+        A function to get the matcher over the stored names, loading the compiled snapshot if it's still valid
+
+        Args:
+        compiled_file: {str}     The path to the compiled snapshot, rebuilt and saved when it's missing or out of date
+
+        Returns:
+        matcher {TransactionMatcher}
+    """
+    if compiled_file is None:
+      return TransactionMatcher(self.categories)
+
+    cache_key = self.cache_key()
+    matcher = TransactionMatcher.load(compiled_file, cache_key)
+    if matcher is None:
+      matcher = TransactionMatcher(self.categories)
+      matcher.save(compiled_file, cache_key)
+    return matcher
+
+
+  def flush(self):
+    """
+        A function to save the names added since the last flush, compacting the journal once it's grown large enough
+
+        Returns:
+        compacted {bool}     True if the journal was folded into a new snapshot, which can reorder the categories
+    """
+    if self.pending:
+      logger.debug("Journaling %d new transaction names", len(self.pending))
+      with open(self.journal_file, 'at') as tjf:
+        tjf.writelines(json.dumps({"TransName": trans_name, "TransType": trans_type}) + "\n" for trans_name, trans_type in self.pending)
+        tjf.flush()
+        os.fsync(tjf.fileno())
+      self.journal_entries += len(self.pending)
+      self.pending = []
+
+    if self.snapshot_stale or self.journal_entries >= self.compact_after:
+      self.compact()
+      return True
+
+    return False
+
+
+  def compact(self):
+    """
+        A function to fold the journal into a new snapshot, replacing the old one in a single step so a crash can't leave it half written
+    """
+    logger.info(f"Compacting the transaction cache, {len(self.trans_types)} names")
+    temp_snapshot_file = self.snapshot_file + ".tmp"
+    with open(temp_snapshot_file, 'wt') as tsf:
+      tsf.write(json.dumps(self.categories, indent=4, sort_keys=True))
+      tsf.flush()
+      os.fsync(tsf.fileno())
+    os.replace(temp_snapshot_file, self.snapshot_file)
+
+    # Replaying journal entries already in the snapshot is harmless, so a crash before this point loses nothing
+    if os.path.exists(self.journal_file):
+      os.remove(self.journal_file)
+    self.pending = []
+    self.journal_entries = 0
+    self.snapshot_stale = False
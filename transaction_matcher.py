@@ -0,0 +1,238 @@
+import logging
+import os
+import pickle
+
+from generic_helper import normalize_trans_name
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class TransactionMatcher:
+  """
+      A compiled lookup over the stored transaction cache
+
+      A transaction name is categorized as the first category (in cache order) holding a stored name that contains it.
+      Rather than scanning every stored name per transaction, the stored names are compiled into a generalized suffix
+      automaton: every substring of every stored name is a path from the root, and each state remembers the lowest
+      category rank of the stored names it occurs in. A lookup is then a single walk over the characters of the
+      transaction name, independent of how large the cache grows.
+
+      Names are compared normalized (whitespace collapsed, upper case), so spacing and case variants of a merchant
+      match the same stored name. Resolved lookups are kept in an exact-name hash index so repeated merchants cost
+      a single dict hit.
+
+      The compiled matcher can be saved as a binary snapshot, keyed by the hash of the cache it was built from, and
+      loaded back in place of rebuilding it while the cache is unchanged.
+  """
+  def __init__(self, trans_stored_cache=None):
+    logger.debug("Initializing TransactionMatcher")
+
+    # Category names in first-match-wins order, and their rank in that order
+    self.categories = []
+    self._category_rank = {}
+
+    # Suffix automaton states, stored column-wise to keep the structure compact and cheap to pickle
+    # _next - outgoing transitions per state {char: state}
+    # _link - suffix link per state
+    # _length - length of the longest substring ending at the state
+    # _rank - lowest category rank among the stored names containing the state's substrings (None if unused)
+    # _seen - id of the last stored name that marked the state, so each name only marks a state once
+    self._next = [{}]
+    self._link = [-1]
+    self._length = [0]
+    self._rank = [None]
+    self._seen = [-1]
+    self._names_added = 0
+
+    # Exact-name index of resolved lookups {trans_name: category}
+    self._exact_index = {}
+
+    if trans_stored_cache:
+      for category, trans_names in trans_stored_cache.items():
+        self.add_category(category)
+        for trans_name in trans_names:
+          self.add(trans_name, category)
+
+
+  def __len__(self):
+    return self._names_added
+
+
+  @classmethod
+  def load(cls, compiled_file, cache_key):
+    """
+        A function to load a matcher saved by save, if it was built from the same cache
+
+        Args:
+        compiled_file: {str}     The path to the saved matcher
+        cache_key: {str}         The hash of the cache the matcher needs to have been built from
+
+        Returns:
+        matcher {TransactionMatcher}    The saved matcher, None if there isn't one or it was built from another cache
+    """
+    try:
+      with open(compiled_file, 'rb') as cf:
+        compiled = pickle.load(cf)
+    except FileNotFoundError:
+      return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as load_error:
+      logger.warning(f"Ignoring unreadable compiled matcher {compiled_file}: {load_error}")
+      return None
+
+    if compiled.get("cache_key") != cache_key:
+      logger.debug("Compiled matcher %s is out of date", compiled_file)
+      return None
+
+    logger.debug("Loaded compiled matcher from %s", compiled_file)
+    return compiled["matcher"]
+
+
+  def save(self, compiled_file, cache_key):
+    """
+        A function to save the compiled matcher, replacing any earlier one in a single step
+
+        Args:
+        compiled_file: {str}     The path to save the matcher to
+        cache_key: {str}         The hash of the cache the matcher was built from
+    """
+    logger.debug("Saving compiled matcher to %s", compiled_file)
+    # Lookups resolved this run aren't part of the compiled structure, leave them out of the snapshot
+    exact_index, self._exact_index = self._exact_index, {}
+    try:
+      os.makedirs(os.path.dirname(compiled_file), exist_ok=True)
+      temp_compiled_file = compiled_file + ".tmp"
+      with open(temp_compiled_file, 'wb') as cf:
+        pickle.dump({"cache_key": cache_key, "matcher": self}, cf, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(temp_compiled_file, compiled_file)
+    finally:
+      self._exact_index = exact_index
+
+
+  def add_category(self, category):
+    """
+        A function to register a category, appending it to the end of the first-match-wins order
+
+        Args:
+        category: {str}    The category name
+    """
+    if category not in self._category_rank:
+      self._category_rank[category] = len(self.categories)
+      self.categories.append(category)
+
+
+  def add(self, trans_name, category):
+    """
+        A function to add a newly categorized transaction name to the matcher in place
+
+        Args:
+        trans_name: {str}    The transaction name as stored in the cache
+        category: {str}      The category the transaction name belongs to
+    """
+    self.add_category(category)
+    rank = self._category_rank[category]
+    name_id = self._names_added
+    self._names_added += 1
+
+    # Any previously resolved lookup may now resolve to an earlier category
+    self._exact_index.clear()
+    trans_name = normalize_trans_name(trans_name)
+
+    # The root holds the empty substring, which every stored name contains
+    self._mark(0, name_id, rank)
+
+    last = 0
+    for char in trans_name:
+      last = self._extend(last, char)
+      state = last
+      while state > 0 and self._seen[state] != name_id:
+        self._mark(state, name_id, rank)
+        state = self._link[state]
+
+
+  def match(self, trans_name):
+    """
+        A function to find the category of a transaction name
+
+        Args:
+        trans_name: {str}    The transaction name from the statement
+
+        Returns:
+        category {str}       The first category holding a stored name containing trans_name, None if there isn't one
+    """
+    try:
+      return self._exact_index[trans_name]
+    except KeyError:
+      pass
+    except TypeError:
+      # Unhashable / missing names (ex. NaN from an empty cell) can't be categorized
+      return None
+
+    normalized_name = normalize_trans_name(trans_name)
+    if normalized_name is None:
+      return None
+
+    state = 0
+    for char in normalized_name:
+      state = self._next[state].get(char)
+      if state is None:
+        break
+
+    rank = self._rank[state] if state is not None else None
+    category = self.categories[rank] if rank is not None else None
+    self._exact_index[trans_name] = category
+
+    return category
+
+
+  def _mark(self, state, name_id, rank):
+    self._seen[state] = name_id
+    if self._rank[state] is None or rank < self._rank[state]:
+      self._rank[state] = rank
+
+
+  def _new_state(self, length, link, transitions, rank, seen):
+    self._next.append(transitions)
+    self._link.append(link)
+    self._length.append(length)
+    self._rank.append(rank)
+    self._seen.append(seen)
+    return len(self._next) - 1
+
+
+  def _extend(self, last, char):
+    """
+        Extend the generalized suffix automaton by one character from the state `last`, returning the state for the
+        new prefix. Follows the standard online construction, reusing an existing transition when the prefix has
+        already been added by another stored name.
+    """
+    existing = self._next[last].get(char)
+    if existing is not None:
+      if self._length[last] + 1 == self._length[existing]:
+        return existing
+      return self._clone(last, char, existing)
+
+    current = self._new_state(self._length[last] + 1, 0, {}, None, -1)
+    state = last
+    while state != -1 and char not in self._next[state]:
+      self._next[state][char] = current
+      state = self._link[state]
+
+    if state != -1:
+      target = self._next[state][char]
+      if self._length[state] + 1 == self._length[target]:
+        self._link[current] = target
+      else:
+        self._link[current] = self._clone(state, char, target)
+
+    return current
+
+
+  def _clone(self, state, char, target):
+    # The clone represents the shorter substrings of target, so it occurs in at least every name target occurs in
+    clone = self._new_state(self._length[state] + 1, self._link[target], dict(self._next[target]), self._rank[target], self._seen[target])
+    while state != -1 and self._next[state].get(char) == target:
+      self._next[state][char] = clone
+      state = self._link[state]
+    self._link[target] = clone
+    return clone
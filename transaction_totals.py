@@ -0,0 +1,231 @@
+import logging
+
+import pandas as pd
+
+from generic_helper import MONTH_ABBREVIATIONS
+
+# Initialize the logger
+logger = logging.getLogger(__name__)
+
+
+class TransactionTotals:
+  """
+      Running totals of the categorized transactions, keyed by (category, year, month)
+
+      Each statement's totals are kept as a partial aggregate under the statement's name. Adding a new statement
+      only adds its own (category, year, month) cells to the combined totals, and a statement that is processed
+      again replaces its earlier partial. The budget views are all built from the combined totals.
+
+      Amounts are summed as whole cents, so totals don't drift however the statements are split or reprocessed,
+      and are only turned into dollars by the budget views.
+  """
+  KEYS = ["TransType", "Year", "Month"]
+
+  def __init__(self, trans_types_list):
+    logger.debug("Initializing TransactionTotals")
+    self.trans_types_list = list(trans_types_list)
+    self.partials = {}
+    self._combined = self._empty()
+
+
+  @classmethod
+  def _empty(cls):
+    return pd.Series(dtype="int64", index=pd.MultiIndex.from_tuples([], names=cls.KEYS), name="Amount")
+
+
+  @classmethod
+  def reduce_statement(cls, trans_types, trans_dates, amounts):
+    """
+        A function to reduce a categorized statement to its partial aggregate
+
+        Args:
+        trans_types: {pd.Series}    The category of each transaction
+        trans_dates: {pd.Series}    The datetime of each transaction
+        amounts: {pd.Series}        The signed amount of each transaction, in cents
+
+        Returns:
+        partial {pd.Series}         The summed amounts in cents, indexed by (TransType, Year, Month)
+    """
+    partial = amounts.groupby([trans_types.astype(object).rename("TransType"), trans_dates.dt.year.rename("Year"), trans_dates.dt.month.rename("Month")]).sum()
+    if partial.empty:
+      return cls._empty()
+
+    partial.index = partial.index.set_levels([level.astype(int) for level in partial.index.levels[1:]], level=[1, 2])
+    return partial.rename("Amount").astype("int64")
+
+
+  @classmethod
+  def to_records(cls, partial):
+    """
+        A function to turn a partial aggregate into plain lists, to be stored as JSON
+
+        Args:
+        partial: {pd.Series}    A partial aggregate, as returned by reduce_statement
+
+        Returns:
+        records {list}          [TransType, Year, Month, Amount] lists, with Amount in cents
+    """
+    return [[trans_type, int(year), int(month), int(amount)] for (trans_type, year, month), amount in partial.items()]
+
+
+  @classmethod
+  def from_records(cls, records):
+    """
+        A function to rebuild a partial aggregate from the lists made by to_records
+
+        Args:
+        records: {list}         [TransType, Year, Month, Amount] lists
+
+        Returns:
+        partial {pd.Series}     The partial aggregate
+    """
+    if not records:
+      return cls._empty()
+
+    records_df = pd.DataFrame(records, columns=cls.KEYS + ["Amount"])
+    return records_df.set_index(cls.KEYS)["Amount"].astype("int64")
+
+
+  @classmethod
+  def is_records(cls, records):
+    """
+        A function to check stored totals are lists made by to_records, older runs kept them per month or in dollars
+
+        Args:
+        records: {list}         The stored totals
+
+        Returns:
+        is_records {bool}       True if from_records can rebuild them
+    """
+    return isinstance(records, list) and all(isinstance(record, list) and len(record) == 4 and isinstance(record[3], int) for record in records)
+
+
+  @classmethod
+  def combine(cls, partials):
+    """
+        A function to sum partial aggregates, Ex. the batches of one statement
+
+        Args:
+        partials: {list}        Partial aggregates, as returned by reduce_statement
+
+        Returns:
+        partial {pd.Series}     The summed amounts, indexed by (TransType, Year, Month)
+    """
+    non_empty_partials = [partial for partial in partials if not partial.empty]
+    return pd.concat(non_empty_partials).groupby(level=cls.KEYS).sum() if non_empty_partials else cls._empty()
+
+
+  def update(self, source, partial):
+    """
+        A function to add, or replace, one statement's partial aggregate
+
+        Args:
+        source: {str}           The statement the partial aggregate came from
+        partial: {pd.Series}    The partial aggregate, as returned by reduce_statement
+    """
+    previous_partial = self.partials.get(source)
+    self.partials[source] = partial
+
+    if previous_partial is not None:
+      # Subtracting the old cells would leave cells at 0 behind, so rebuild from the partials instead
+      self._combined = None
+    elif self._combined is not None:
+      self._combined = self._combined.add(partial, fill_value=0).astype("int64") if not self._combined.empty else partial.copy()
+
+
+  def combined(self):
+    """
+        A function to get the totals over every statement
+
+        Returns:
+        combined {pd.Series}    The summed amounts in cents, indexed by (TransType, Year, Month)
+    """
+    if self._combined is None:
+      self._combined = self.combine(self.partials.values())
+
+    return self._combined
+
+
+  def years(self):
+    """
+        A function to list the years with any transactions
+
+        Returns:
+        years {list}
+    """
+    return sorted(self.combined().index.get_level_values("Year").unique())
+
+
+  def _categories(self, combined):
+    # Every known category in cache order, then any category only seen in the totals
+    found_trans_types = combined.index.get_level_values("TransType").unique()
+    return self.trans_types_list + [trans_type for trans_type in found_trans_types if trans_type not in self.trans_types_list]
+
+
+  def monthly_budget(self, year):
+    """
+        A function to build one year's budget, as the Category x Jan..Dec layout
+
+        Args:
+        year: {int}                   The year to build the budget for
+
+        Returns:
+        budget_df {pd.DataFrame}      Amount per category (rows) and month (columns), empty where there were no transactions
+    """
+    combined = self.combined()
+    year_totals = combined[combined.index.get_level_values("Year") == year].droplevel("Year") / 100
+
+    budget_df = year_totals.unstack("Month") if not year_totals.empty else pd.DataFrame()
+    budget_df = budget_df.reindex(index=self._categories(combined), columns=range(1, 13))
+    budget_df.columns = MONTH_ABBREVIATIONS
+    budget_df.index.name = "Category"
+
+    return budget_df
+
+
+  def yearly_budget(self):
+    """
+        A function to build the multi-year view, totalling each category per year
+
+        Returns:
+        budget_df {pd.DataFrame}      Amount per category (rows) and year (columns)
+    """
+    combined = self.combined()
+    yearly_totals = combined.groupby(level=["TransType", "Year"]).sum() / 100
+
+    budget_df = yearly_totals.unstack("Year") if not yearly_totals.empty else pd.DataFrame()
+    budget_df = budget_df.reindex(index=self._categories(combined), columns=self.years())
+    budget_df.index.name = "Category"
+
+    return budget_df
+
+
+  def rolling_budget(self, months=12):
+    """
+        A function to build the rolling view, covering the latest months with transactions
+
+        Args:
+        months: {int}                 The number of months to cover, ending at the latest month with transactions
+
+        Returns:
+        budget_df {pd.DataFrame}      Amount per category (rows) and month (columns, labelled as Ex. Dec 2024)
+    """
+    combined = self.combined()
+    month_periods = [pd.Period(year=year, month=month, freq="M") for year, month in zip(
+      combined.index.get_level_values("Year"), combined.index.get_level_values("Month")
+    )]
+    if not month_periods:
+      return pd.DataFrame(index=pd.Index(self.trans_types_list, name="Category"))
+
+    covered_periods = pd.period_range(end=max(month_periods), periods=months, freq="M")
+    period_totals = pd.Series(combined.to_numpy() / 100, index=pd.MultiIndex.from_arrays(
+      [combined.index.get_level_values("TransType"), pd.PeriodIndex(month_periods)], names=["TransType", "Period"]
+    ))
+    period_totals = period_totals[period_totals.index.get_level_values("Period").isin(covered_periods)]
+
+    budget_df = period_totals.unstack("Period") if not period_totals.empty else pd.DataFrame()
+    budget_df = budget_df.reindex(index=self._categories(combined), columns=covered_periods)
+    budget_df.columns = [period.strftime("%b %Y") for period in covered_periods]
+    budget_df.index.name = "Category"
+
+    return budget_df